@@ -0,0 +1,216 @@
+#Benchmark program file
+#benchmark.py
+
+# The purpose of this program is to measure how fast the calculator is, so that a slower commit can be caught
+# by comparing its results with the results of an earlier commit.
+# It generates synthetic communities (from 10 to 10^7 species, and from 1 to 10^5 sites) and synthetic
+# species files with a chosen share of malformed lines, then times:
+#   - the scalar index functions Shannon_Index and Simpson_Index on one site,
+#   - the vectorized Batch_Index on a sites-by-species matrix,
+#   - the file parser (Read_Species_File, the reader behind File_Input) on the synthetic files.
+# For every case it reports the best and median time, the throughput and the peak memory, and saves
+# everything as JSON together with the commit it was run on.
+#
+# Usage:
+#   python benchmark.py --out bench.json                    quick grid
+#   python benchmark.py --full --out bench.json             the full grid (takes a long time and a lot of memory)
+#   python benchmark.py --out new.json --compare old.json   also prints how each case changed against old.json
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import calculator
+
+QUICK_SPECIES = [10, 1000, 100000]
+FULL_SPECIES = [10, 100, 1000, 10000, 100000, 1000000, 10000000]
+QUICK_SITES = [1, 100, 10000]
+FULL_SITES = [1, 10, 100, 1000, 10000, 100000]
+QUICK_FILE_LINES = [1000, 100000]
+FULL_FILE_LINES = [1000, 100000, 10000000]
+#a batch case is skipped if its matrix would have more cells than this
+MAX_BATCH_CELLS = 50000000
+
+
+def Synthetic_Community(rng, sites, species):
+    """Returns a sites-by-species matrix of counts drawn from a log-normal abundance distribution,
+        so a few species are common and many are rare, as in real survey data. Every count is at least 1."""
+    return (rng.lognormal(mean=2.0, sigma=1.5, size=(sites, species)) + 1).astype('int64').astype('float64')
+
+
+def Synthetic_Species_File(path, rng, lines, malformedShare):
+    """Writes a species file of 'Name, count' lines where about 'malformedShare' of the lines are broken,
+        split evenly between a missing comma, a bad count and a missing species name.
+        Returns the size of the file in bytes."""
+    counts = Synthetic_Community(rng, 1, lines)[0]
+    kinds = rng.random(lines)
+    with open(path, 'w') as f:
+        for i in range(lines):
+            kind = kinds[i] / malformedShare if malformedShare > 0 else 3.0
+            if kind < 1/3:
+                f.write('Species ' + str(i) + ' ' + str(int(counts[i])) + '\n')
+            elif kind < 2/3:
+                f.write('Species ' + str(i) + ', many\n')
+            elif kind < 1:
+                f.write(', ' + str(int(counts[i])) + '\n')
+            else:
+                f.write('Species ' + str(i) + ', ' + str(int(counts[i])) + '\n')
+    return os.path.getsize(path)
+
+
+def Time_Case(function, repeats):
+    """Runs 'function' repeats times, then once more under tracemalloc to find its peak memory.
+        Returns (list of seconds per run, peak bytes allocated)."""
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()                             #timed separately because tracing slows the run down
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def Result(name, params, items, times, peak, extra=None):
+    #one JSON record; throughput is measured on the best time
+    record = {
+        'name': name,
+        'params': params,
+        'best_seconds': min(times),
+        'median_seconds': statistics.median(times),
+        'items_per_second': items / min(times) if min(times) > 0 else None,
+        'peak_memory_bytes': peak,
+    }
+    if extra is not None:
+        record.update(extra)
+    return record
+
+
+def Bench_Scalar(rng, speciesSizes, repeats):
+    results = []
+    for species in speciesSizes:
+        data = Synthetic_Community(rng, 1, species)[0].tolist()
+        for name, function in (('Shannon_Index', calculator.Shannon_Index), ('Simpson_Index', calculator.Simpson_Index)):
+            times, peak = Time_Case(lambda: function(data), repeats)
+            results.append(Result(name, {'species': species}, species, times, peak))
+            print(name, species, 'species:', round(min(times), 6), 's')
+    return results
+
+
+def Bench_Batch(rng, speciesSizes, siteCounts, repeats):
+    results = []
+    for sites in siteCounts:
+        for species in speciesSizes:
+            if sites * species > MAX_BATCH_CELLS:
+                continue
+            matrix = Synthetic_Community(rng, sites, species)
+            times, peak = Time_Case(lambda: calculator.Batch_Index(matrix), repeats)
+            results.append(Result('Batch_Index', {'sites': sites, 'species': species}, sites * species, times, peak))
+            print('Batch_Index', sites, 'sites x', species, 'species:', round(min(times), 6), 's')
+    return results
+
+
+def Bench_Parser(rng, lineCounts, malformedShare, repeats):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for lines in lineCounts:
+            path = os.path.join(directory, 'species_' + str(lines) + '.txt')
+            size = Synthetic_Species_File(path, rng, lines, malformedShare)
+            times, peak = Time_Case(lambda: calculator.Load_Site_File(path), repeats)
+            results.append(Result('Load_Site_File', {'lines': lines, 'malformed_share': malformedShare}, lines, times, peak,
+                                  {'bytes_per_second': size / min(times), 'file_bytes': size}))
+
+            def Stream():
+                for chunk in calculator.Read_Species_File(path, chunkSize=10000):
+                    pass
+            times, peak = Time_Case(Stream, repeats)
+            results.append(Result('Read_Species_File', {'lines': lines, 'malformed_share': malformedShare, 'chunk_size': 10000}, lines, times, peak,
+                                  {'bytes_per_second': size / min(times), 'file_bytes': size}))
+            print('parser', lines, 'lines:', round(min(times), 6), 's')
+    return results
+
+
+def Git_Commit():
+    #the commit being measured, or None outside a git checkout
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except(OSError, subprocess.CalledProcessError):
+        return None
+
+
+def Compare(results, oldPath):
+    """Prints the change of the best time of every case that is also in the JSON file at oldPath."""
+    with open(oldPath, 'r') as f:
+        old = json.load(f)
+    oldTimes = {(record['name'], json.dumps(record['params'], sort_keys=True)): record['best_seconds'] for record in old['results']}
+    print()
+    print('Compared with', oldPath, '(commit', str(old.get('commit')) + ')')
+    for record in results:
+        key = (record['name'], json.dumps(record['params'], sort_keys=True))
+        if key in oldTimes and oldTimes[key] > 0:
+            ratio = record['best_seconds'] / oldTimes[key]
+            print('  ', record['name'], record['params'], ':', round(ratio, 3), 'x the old time', '(SLOWER)' if ratio > 1.1 else '')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the biodiversity index functions and the species file parser.')
+    parser.add_argument('--full', action='store_true', help='use the full grid (10 to 10^7 species, 1 to 10^5 sites)')
+    parser.add_argument('--species', type=int, nargs='+', help='species counts to test (overrides the grid)')
+    parser.add_argument('--sites', type=int, nargs='+', help='site counts to test (overrides the grid)')
+    parser.add_argument('--lines', type=int, nargs='+', help='species file sizes in lines (overrides the grid)')
+    parser.add_argument('--malformed', type=float, default=0.05, help='share of malformed lines in the species files (default 0.05)')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per case (default 3)')
+    parser.add_argument('--seed', type=int, default=12345, help='seed of the synthetic data (default 12345)')
+    parser.add_argument('--only', choices=('scalar', 'batch', 'parser'), nargs='+', help='run only these groups')
+    parser.add_argument('--out', help='JSON file for the results')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    rng = np.random.default_rng(args.seed)
+    speciesSizes = args.species or (FULL_SPECIES if args.full else QUICK_SPECIES)
+    siteCounts = args.sites or (FULL_SITES if args.full else QUICK_SITES)
+    lineCounts = args.lines or (FULL_FILE_LINES if args.full else QUICK_FILE_LINES)
+    groups = args.only or ('scalar', 'batch', 'parser')
+
+    results = []
+    if 'scalar' in groups:
+        results += Bench_Scalar(rng, speciesSizes, args.repeats)
+    if 'batch' in groups:
+        results += Bench_Batch(rng, speciesSizes, siteCounts, args.repeats)
+    if 'parser' in groups:
+        results += Bench_Parser(rng, lineCounts, args.malformed, args.repeats)
+
+    report = {
+        'commit': Git_Commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeats': args.repeats,
+        'results': results,
+    }
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('Results saved to', args.out)
+    if args.compare is not None:
+        Compare(results, args.compare)
+    return 0
+
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -17,14 +17,17 @@
 # This program recieves values either through manual user input or by having the user choose between 
 # two locations that have data sets already associated with them. The program also asks the user to 
 # choose which indices they want to be calculated. 
-# The output of this program are the calculated index values to a single csv file that shows the user 
-# the final results of the calculation as well as the values used to calculate them. 
+# For batch jobs the program can also run without any prompts, for example:
+#   python -m calculator --input <species file or directory> --indices shannon,simpson --out results.csv
+# and other programs can import it and call compute(data, indices=...) directly.
+# The output of this program are two tidy csv tables: the species counts used (site, species, count) and the 
+# calculated index values (site, index, value). New results are appended, so the files build up like a small database 
+# table across runs. The command line can also write both tables as compressed NumPy .npz archives. 
 
 # This program assumes that the data provided by the user is accurate and in the form of comma delineated 
-# integers as requested. It also assumes that the format of the output, in a csv file, is suitable for their needs 
-# The format of this output is also recoginized as a limitation as it provides less allowance for manipulation 
-# in more complicated ways such as being appended to a database where there is more  opportunity for analysis. 
-# This program also limits the user to working with data at two locations if they choose the file input.
+# integers as requested. 
+# The interactive program also limits the user to working with data at two locations if they choose the file input;
+# the command line accepts any number of site files, a directory of them, or a manifest.
 
 #Contribution Statements: 
 #   Kira-Marie Lazda: Manual Input function, Main function, provided txt files for file input option
@@ -82,6 +85,399 @@ def Simpson_Index(speciesData):
         SimpsonsResults = 1-(niSum/N)
     return SimpsonsResults 
 
+def Diversity_Profile(speciesData, q=(0, 1, 2)):
+    """Diversity_Profile calculates the whole family of diversity measures for one site in a single pass over the data.
+        Inputs: 'speciesData' - a list of the number of individuals per species. Zero or negative counts are treated as absent species.
+                'q' - the orders of the Hill numbers to calculate (any real numbers, including inf and -inf).
+        Purpose: the loop collects, once per species, every term the measures share: the total N, the richness S,
+                 the sums of n*log(n), n*(n-1) and n**q, the largest and smallest counts, and the number of singletons F1
+                 and doubletons F2. The sums of n**q are kept in log space (a running log-sum-exp), so Hill numbers of
+                 any order stay finite instead of overflowing for large counts.
+                 Every measure is then a few arithmetic steps on those sums:
+                    Shannon H = log(N) - sum(n*log(n))/N, equitability = H/log(S)      (as in Shannon_Index)
+                    Simpson D = 1 - sum(n*(n-1))/(N*(N-1))                              (as in Simpson_Index)
+                    inverse Simpson = N*(N-1)/sum(n*(n-1)), the inverse of the same (unbiased) dominance
+                    Hill number of order q = (sum((n/N)**q))**(1/(1-q)), and exp(H) for q = 1,
+                        N/largest n (1/Berger-Parker) for q = inf and N/smallest n for q = -inf
+                    Berger-Parker dominance = largest n / N
+                    Chao1 = S + F1**2/(2*F2), or S + F1*(F1-1)/2 when there are no doubletons
+        Returns: a dictionary with 'individuals', 'richness', 'shannon', 'equitability', 'simpson', 'inverse_simpson',
+                 'berger_parker', 'chao1' and one 'hill_<q>' entry per order (e.g. 'hill_2', 'hill_0.5', 'hill_inf').
+                 Values that cannot be computed for this data are NaN. Raises ValueError when no species has any individuals."""
+    import math
+
+    orders = [float(order) for order in q]
+    #orders 0, 1, 2 and +-inf come from the other sums
+    powers = [order for order in orders if order not in (0.0, 1.0, 2.0, math.inf, -math.inf)]
+    #sum(n**q) = exp(logMax) * logSum, where logMax is the largest q*log(n) seen so far
+    logMax = [-math.inf] * len(powers)
+    logSum = [0.0] * len(powers)
+    log = math.log
+    exp = math.exp
+    total = 0
+    richness = 0
+    nlognSum = 0.0
+    niSum = 0
+    largest = 0
+    smallest = math.inf
+    singletons = 0
+    doubletons = 0
+    for n in speciesData:
+        if n <= 0:
+            continue
+        richness += 1
+        total += n
+        logn = log(n)
+        nlognSum += n * logn
+        niSum += n * (n - 1)
+        if n > largest:
+            largest = n
+        if n < smallest:
+            smallest = n
+        if n == 1:
+            singletons += 1
+        elif n == 2:
+            doubletons += 1
+        if powers:
+            for j in range(len(powers)):
+                term = powers[j] * logn
+                if term > logMax[j]:
+                    logSum[j] = logSum[j] * exp(logMax[j] - term) + 1.0
+                    logMax[j] = term
+                else:
+                    logSum[j] += exp(term - logMax[j])
+    if richness == 0:
+        raise ValueError('no species with a positive number of individuals')
+
+    profile = {'individuals': total, 'richness': richness}
+    ShannonIndex = max(math.log(total) - nlognSum / total, 0.0)
+    profile['shannon'] = ShannonIndex
+    profile['equitability'] = ShannonIndex / math.log(richness) if richness > 1 else math.nan
+    N = total * (total - 1)
+    profile['simpson'] = 1 - (niSum / N) if richness > 1 and N != 0 else math.nan
+    profile['inverse_simpson'] = N / niSum if richness > 1 and niSum > 0 else math.nan
+    profile['berger_parker'] = largest / total
+    if doubletons > 0:
+        profile['chao1'] = richness + singletons ** 2 / (2 * doubletons)
+    else:
+        profile['chao1'] = richness + singletons * (singletons - 1) / 2
+    for order in orders:
+        if order == 0.0:
+            value = float(richness)
+        elif order == 1.0:
+            value = math.exp(ShannonIndex)
+        elif order == 2.0:
+            value = total ** 2 / (niSum + total)            #sum(n**2) = sum(n*(n-1)) + N
+        elif order == math.inf:
+            value = total / largest
+        elif order == -math.inf:
+            value = total / smallest
+        else:
+            j = powers.index(order)
+            logPowerSum = logMax[j] + math.log(logSum[j]) - order * math.log(total)     #log(sum((n/N)**q))
+            value = math.exp(logPowerSum / (1 - order))
+        profile['hill_' + format(order, 'g')] = value
+    return profile
+
+
+def Batch_Index(abundance, offsets=None):
+    """Batch_Index function scores many sites at once instead of calling Shannon_Index and Simpson_Index once per site.
+        Inputs: 'abundance' - either a 2-D sites-by-species array of counts (zeros mean the species is absent at that site),
+                or, when 'offsets' is given, a flat 1-D array of the counts of every site laid end to end.
+                'offsets' - optional 1-D array of length (number of sites + 1); the counts of site i are abundance[offsets[i]:offsets[i+1]].
+        Purpose: computes Shannon's index, Shannon's equitability and Simpson's index (with the same N(N-1) correction
+                 as Simpson_Index) for every site in one vectorized pass using NumPy.
+        Returns: a tuple of three 1-D float arrays (ShannonIndex, EquitabilityIndex, SimpsonsIndex), one value per site.
+                 Values that the scalar functions cannot compute (fewer than 2 species, a single species for equitability)
+                 are returned as NaN instead of raising an error or returning "N/A"."""
+    import numpy as np
+
+    if offsets is None:
+        counts = np.asarray(abundance, dtype=np.float64)
+        if counts.ndim != 2:
+            raise ValueError('abundance must be a 2-D sites-by-species array when no offsets are given')
+        siteCount = counts.shape[0]
+        total = counts.sum(axis=1)
+        #proportion of each species at its site; rows with no individuals give 0/0, which is masked out below
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pi = counts / total[:, None]
+            plogp = np.where(counts > 0, pi * np.log(np.where(counts > 0, pi, 1.0)), 0.0)
+        shannonSum = plogp.sum(axis=1)
+        richness = np.count_nonzero(counts > 0, axis=1)
+        niSum = (counts * (counts - 1)).sum(axis=1)
+    else:
+        values = np.asarray(abundance, dtype=np.float64).ravel()
+        offsets = np.asarray(offsets, dtype=np.intp)
+        if offsets.ndim != 1 or len(offsets) < 1 or offsets[0] != 0 or offsets[-1] != len(values) or np.any(np.diff(offsets) < 0):
+            raise ValueError('offsets must be non-decreasing, start at 0 and end at len(abundance)')
+        siteCount = len(offsets) - 1
+        #label every value with the row (site) it belongs to, then reduce per row with bincount
+        siteIds = np.repeat(np.arange(siteCount), np.diff(offsets))
+        total = np.bincount(siteIds, weights=values, minlength=siteCount)
+        present = values > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pi = values / total[siteIds]
+            plogp = np.where(present, pi * np.log(np.where(present, pi, 1.0)), 0.0)
+        shannonSum = np.bincount(siteIds, weights=plogp, minlength=siteCount)
+        richness = np.bincount(siteIds, weights=present, minlength=siteCount)
+        niSum = np.bincount(siteIds, weights=values * (values - 1), minlength=siteCount)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ShannonIndex = np.where(total > 0, 0.0 - shannonSum, np.nan)
+        EquitabilityIndex = np.where(richness > 1, ShannonIndex / np.log(np.maximum(richness, 2)), np.nan)
+        N = total * (total - 1)
+        SimpsonsIndex = np.where((richness >= 2) & (N != 0), 1 - niSum / np.where(N != 0, N, 1.0), np.nan)
+    return ShannonIndex.reshape(siteCount), EquitabilityIndex.reshape(siteCount), SimpsonsIndex.reshape(siteCount)
+
+
+def Batch_Profile(abundance, q=(0, 1, 2)):
+    """Batch_Profile is Diversity_Profile for many sites at once.
+        Inputs: 'abundance' - a 2-D sites-by-species array of counts (zero or negative counts are absent species);
+                'q' - the orders of the Hill numbers to calculate, as for Diversity_Profile.
+        Purpose: works out the same sums as Diversity_Profile (the power sums in log space too) with NumPy, one
+                 vectorized pass over the whole array instead of a Python loop per species and per site.
+        Returns: a dictionary with the same keys as Diversity_Profile, each a 1-D array with one value per site
+                 (the richness as integers, every other measure as floats). Sites with no individuals have a richness
+                 of 0 and NaN for every measure."""
+    import numpy as np
+
+    counts = np.asarray(abundance, dtype=np.float64)
+    if counts.ndim != 2:
+        raise ValueError('abundance must be a 2-D sites-by-species array')
+    present = counts > 0
+    n = np.where(present, counts, 0.0)
+    logn = np.log(np.where(present, counts, 1.0))
+    total = n.sum(axis=1)
+    richness = present.sum(axis=1)
+    nlognSum = (n * logn).sum(axis=1)
+    niSum = (n * (n - 1)).sum(axis=1)
+    largest = n.max(axis=1, initial=0.0)
+    smallest = np.where(present, counts, np.inf).min(axis=1, initial=np.inf)
+    singletons = (n == 1).sum(axis=1)
+    doubletons = (n == 2).sum(axis=1)
+
+    profile = {'individuals': total, 'richness': richness}
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        empty = richness == 0
+        ShannonIndex = np.where(empty, np.nan, np.maximum(np.log(total) - nlognSum / total, 0.0))
+        profile['shannon'] = ShannonIndex
+        profile['equitability'] = np.where(richness > 1, ShannonIndex / np.log(np.maximum(richness, 2)), np.nan)
+        N = total * (total - 1)
+        profile['simpson'] = np.where((richness > 1) & (N != 0), 1 - niSum / N, np.nan)
+        profile['inverse_simpson'] = np.where((richness > 1) & (niSum > 0), N / niSum, np.nan)
+        profile['berger_parker'] = np.where(empty, np.nan, largest / total)
+        profile['chao1'] = np.where(empty, np.nan, np.where(doubletons > 0, richness + singletons ** 2 / (2 * np.maximum(doubletons, 1)),
+                                                            richness + singletons * (singletons - 1) / 2))
+        for order in (float(order) for order in q):
+            if order == 0.0:
+                value = richness
+            elif order == 1.0:
+                value = np.exp(ShannonIndex)
+            elif order == 2.0:
+                value = total ** 2 / (niSum + total)            #sum(n**2) = sum(n*(n-1)) + N
+            elif order == np.inf:
+                value = total / largest
+            elif order == -np.inf:
+                value = total / smallest
+            else:
+                #log(sum((n/N)**q)) as a log-sum-exp over the present species
+                terms = np.where(present, order * logn, -np.inf)
+                logMax = terms.max(axis=1, initial=-np.inf)
+                logPowerSum = logMax + np.log(np.exp(terms - np.where(empty, 0.0, logMax)[:, None]).sum(axis=1)) - order * np.log(total)
+                value = np.exp(logPowerSum / (1 - order))
+            profile['hill_' + format(order, 'g')] = np.where(empty, np.nan, value)
+    return profile
+
+def Resample_Index(speciesData, method='bootstrap', resamples=1000, depth=None, seed=None, confidence=0.95, batchSize=None):
+    """Resample_Index estimates how uncertain Shannon's and Simpson's indices of one site are by resampling its individuals.
+        Inputs: 'speciesData' - a list of the number of individuals per species (zero counts are ignored).
+                'method' - 'bootstrap' draws the same number of individuals as the site, with replacement (multinomial);
+                           'rarefy' draws 'depth' individuals without replacement (multivariate hypergeometric),
+                           which gives rarefied diversity so sites sampled with different effort can be compared.
+                'resamples' - number of resampled communities, 'seed' - an int or numpy SeedSequence for repeatable results,
+                'confidence' - width of the percentile interval, 'batchSize' - resamples drawn and scored together
+                (default: as many as fit in about 2 million counts).
+        Purpose: every batch of resamples is drawn as one matrix and scored with Batch_Index, so the index definitions
+                 (and the N(N-1) Simpson correction) are the same as Shannon_Index and Simpson_Index.
+        Returns: a dictionary for 'shannon', 'equitability' and 'simpson', each a dictionary with the 'mean',
+                 the standard error 'stderr' (standard deviation of the resampled values) and the percentile interval
+                 'low' and 'high'. Resamples where an index cannot be computed (e.g. only one species drawn) are left out."""
+    import numpy as np
+
+    counts = np.asarray(speciesData, dtype=np.float64)
+    counts = counts[counts > 0]
+    if len(counts) == 0:
+        raise ValueError('no species with a positive number of individuals')
+    if not 0 < confidence < 1:
+        raise ValueError('confidence must be between 0 and 1')
+    total = int(round(counts.sum()))
+    rng = np.random.default_rng(seed)
+    if method == 'bootstrap':
+        proportions = counts / counts.sum()
+        draw = lambda size: rng.multinomial(total, proportions, size=size)
+    elif method == 'rarefy':
+        if depth is None or depth < 1 or depth > total:
+            raise ValueError('depth must be between 1 and the number of individuals at the site (' + str(total) + ')')
+        intCounts = np.rint(counts).astype(np.int64)
+        draw = lambda size: rng.multivariate_hypergeometric(intCounts, depth, size=size)
+    else:
+        raise ValueError("unknown resampling method " + repr(method) + ", choose 'bootstrap' or 'rarefy'")
+    if batchSize is None:
+        batchSize = max(1, 2000000 // len(counts))
+
+    values = {'shannon': [], 'equitability': [], 'simpson': []}
+    done = 0
+    while done < resamples:
+        size = min(batchSize, resamples - done)
+        ShannonIndex, EquitabilityIndex, SimpsonsIndex = Batch_Index(draw(size))
+        values['shannon'].append(ShannonIndex)
+        values['equitability'].append(EquitabilityIndex)
+        values['simpson'].append(SimpsonsIndex)
+        done += size
+
+    summary = {}
+    tail = (1 - confidence) / 2 * 100
+    for name, batches in values.items():
+        resampled = np.concatenate(batches)
+        resampled = resampled[~np.isnan(resampled)]
+        if len(resampled) == 0:
+            summary[name] = {'mean': np.nan, 'stderr': np.nan, 'low': np.nan, 'high': np.nan}
+            continue
+        low, high = np.percentile(resampled, [tail, 100 - tail])
+        summary[name] = {
+            'mean': float(resampled.mean()),
+            'stderr': float(resampled.std(ddof=1)) if len(resampled) > 1 else np.nan,
+            'low': float(low),
+            'high': float(high),
+        }
+    return summary
+
+
+def Resample_Sites(siteData, method='bootstrap', resamples=1000, depth=None, seed=0, confidence=0.95, workers=None):
+    """Resample_Sites runs Resample_Index for many sites, spreading the sites over a pool of processes.
+        Inputs: 'siteData' - dictionary of site name to a list of counts, or to (speciesNames, data, ...) as Load_Sites returns.
+                'seed' - one seed for the whole run. Each site gets its own child seed, chosen by the site's position in
+                'siteData', so results do not depend on which worker ran which site. 'workers' - number of processes
+                (default: one per core); 0 or 1 runs every site in this process. Other inputs are as for Resample_Index.
+        Returns: a tuple (results, failures): results maps each site to its Resample_Index dictionary,
+                 failures maps each site that could not be resampled to the reason."""
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+
+    sites = list(siteData)
+    seeds = np.random.SeedSequence(seed).spawn(len(sites))
+    jobs = {}
+    for site, siteSeed in zip(sites, seeds):
+        data = siteData[site]
+        if isinstance(data, tuple):                     #(speciesNames, data, report) from Load_Sites
+            data = data[1]
+        jobs[site] = (data, method, resamples, depth, siteSeed, confidence)
+    results = {}
+    failures = {}
+    if workers is not None and workers <= 1:
+        for site, job in jobs.items():
+            try:
+                results[site] = Resample_Index(*job)
+            except(ValueError) as error:
+                failures[site] = str(error)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {site: pool.submit(Resample_Index, *job) for site, job in jobs.items()}
+            for site, future in futures.items():
+                try:
+                    results[site] = future.result()
+                except Exception as error:
+                    failures[site] = str(error)
+    return results, failures
+
+
+class DiversityAccumulator:
+    """DiversityAccumulator keeps Shannon's and Simpson's indices up to date while individual sightings arrive.
+        It stores the count of each species together with three running sums: the total number of individuals N,
+        the sum of n*log(n) and the sum of n*(n-1). Adding or removing individuals of one species changes each sum
+        by a single term, so every update and every result costs O(1) no matter how many species have been seen,
+        using the identity  H = log(N) - sum(n*log(n))/N.
+        Integer counts keep N and sum(n*(n-1)) exact, and sum(n*log(n)) is updated with a rewritten difference
+        and compensated summation so that it stays accurate for counts in the billions."""
+
+    def __init__(self, counts=None):
+        self.counts = {}            #species name -> number of individuals (species at zero are removed)
+        self.total = 0
+        self.nnSum = 0              #sum of n*(n-1), exact for integer counts
+        self._nlogn = 0.0           #sum of n*log(n) ...
+        self._nlognError = 0.0      #... and the rounding error it has lost so far (Neumaier summation)
+        if counts is not None:
+            for species, count in (counts.items() if isinstance(counts, dict) else counts):
+                self.add(species, count)
+
+    def _change(self, n, k):
+        #returns (n+k)*log(n+k) - n*log(n) without subtracting two huge, nearly equal numbers
+        import math
+        new = n + k
+        if new == 0:
+            return -n * math.log(n)
+        if n == 0:
+            return new * math.log(new)
+        return n * math.log1p(k / n) + k * math.log(new)
+
+    def _addToSum(self, value):
+        #Neumaier compensated summation of value into the running sum of n*log(n)
+        total = self._nlogn + value
+        if abs(self._nlogn) >= abs(value):
+            self._nlognError += (self._nlogn - total) + value
+        else:
+            self._nlognError += (value - total) + self._nlogn
+        self._nlogn = total
+
+    def add(self, species, count=1):
+        """Records 'count' more individuals of 'species' (a negative count removes individuals)."""
+        n = self.counts.get(species, 0)
+        new = n + count
+        if new < 0:
+            raise ValueError('cannot remove ' + str(-count) + ' individuals of ' + repr(species) + ', only ' + str(n) + ' recorded')
+        if count == 0:
+            return
+        self._addToSum(self._change(n, count))
+        self.nnSum += new * (new - 1) - n * (n - 1)
+        self.total += count
+        if new == 0:
+            del self.counts[species]
+        else:
+            self.counts[species] = new
+
+    def remove(self, species, count=1):
+        """Removes 'count' individuals of 'species', e.g. to correct a sighting that was recorded by mistake."""
+        self.add(species, -count)
+
+    def merge(self, other):
+        """Adds every count of another accumulator (for example one shard of the feed) into this one.
+            This costs one update per species of 'other'. Returns this accumulator."""
+        for species, count in other.counts.items():
+            self.add(species, count)
+        return self
+
+    def richness(self):
+        """Returns the number of species with at least one individual."""
+        return len(self.counts)
+
+    def shannon(self):
+        """Returns (ShannonIndex, EquitabilityIndex) like Shannon_Index. Equitability is NaN while only one species has been seen."""
+        import math
+        if self.total <= 0:
+            raise ValueError('no individuals have been recorded')
+        ShannonIndex = math.log(self.total) - (self._nlogn + self._nlognError) / self.total
+        ShannonIndex = max(ShannonIndex, 0.0)           #rounding can leave a tiny negative value when one species dominates
+        if len(self.counts) < 2:
+            return ShannonIndex, math.nan
+        return ShannonIndex, ShannonIndex / math.log(len(self.counts))
+
+    def simpson(self):
+        """Returns Simpson's index like Simpson_Index, including its "N/A" message for fewer than 2 species."""
+        if len(self.counts) < 2:
+            return "N/A - Need more than 2 values to compute Simpson's Index"
+        return 1 - (self.nnSum / (self.total * (self.total - 1)))
+
+
 def Manual_Input():
     """Manual_Input function is called from the main function when the user chooses option 'M' for the data entry choice.
         Inputs: none
@@ -132,91 +528,1733 @@ def Manual_Input():
             print('You forgot to enter your data! Please try again.')
     return finalData
 
+#the two predetermined sites offered by the interactive program, keyed by their menu option
+SITE_FILES = {'A': 'LindsaySpecies.txt', 'B': 'SquamishSpecies.txt'}
+
+
+class _NullStage:
+    #what Instrumentation.stage() returns while instrumentation is off: every call does nothing
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, records=0, bytesRead=0, bytesWritten=0):
+        pass
+
+    def add_file(self, path):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    #one timed run of a stage; its numbers are added to the stage totals when the with-block ends
+    enabled = True
+    __slots__ = ('instruments', 'name', 'start', 'records', 'bytesRead', 'bytesWritten')
+
+    def __init__(self, instruments, name):
+        self.instruments = instruments
+        self.name = name
+        self.records = 0
+        self.bytesRead = 0
+        self.bytesWritten = 0
+
+    def __enter__(self):
+        import time
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        import time
+        self.instruments._record(self, time.perf_counter() - self.start)
+        return False
+
+    def add(self, records=0, bytesRead=0, bytesWritten=0):
+        self.records += records
+        self.bytesRead += bytesRead
+        self.bytesWritten += bytesWritten
+
+    def add_file(self, path):
+        #counts the size of a file that was read in this stage
+        import os
+        try:
+            self.bytesRead += os.path.getsize(path)
+        except(OSError):
+            pass
+
+
+class Instrumentation:
+    """Instrumentation records where a run spends its time, stage by stage ('input', 'cache', 'compute', 'output').
+        The input, compute and output code of the calculator wraps its work in
+            with INSTRUMENTS.stage('input') as stage:
+                ...
+                stage.add(records=..., bytesRead=...)
+        and every stage collects its number of calls, wall time, records processed and bytes read and written.
+        While it is disabled (the default), stage() returns a shared object whose methods do nothing, so the hooks cost
+        about as much as one method call per file or batch and can stay in production code.
+        report() adds the peak memory (resident set size) of the process, and to_json() / to_prometheus() format it.
+        enable(profile=True) also runs cProfile until disable(), and save_profile() writes the pstats file."""
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self._profiler = None
+
+    def enable(self, profile=False):
+        """Starts recording (and profiling with cProfile if 'profile' is true)."""
+        self.enabled = True
+        if profile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def disable(self):
+        """Stops recording and profiling; what was recorded is kept."""
+        self.enabled = False
+        if self._profiler is not None:
+            self._profiler.disable()
+
+    def reset(self):
+        """Forgets every recorded stage and profile (a running profile is stopped first)."""
+        self.stages = {}
+        if self._profiler is not None:
+            self._profiler.disable()
+        self._profiler = None
+
+    def stage(self, name):
+        """Returns the context manager that times one run of stage 'name'."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def _record(self, stage, seconds):
+        totals = self.stages.get(stage.name)
+        if totals is None:
+            totals = self.stages[stage.name] = {'calls': 0, 'seconds': 0.0, 'records': 0, 'bytes_read': 0, 'bytes_written': 0}
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        totals['records'] += stage.records
+        totals['bytes_read'] += stage.bytesRead
+        totals['bytes_written'] += stage.bytesWritten
+
+    def peak_memory(self):
+        """Returns the peak resident memory of this process in bytes, or None where the platform cannot tell."""
+        import sys
+        try:
+            import resource
+        except(ImportError):
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024     #macOS reports bytes, Linux kilobytes
+
+    def report(self):
+        """Returns {'stages': {name: totals}, 'peak_memory_bytes': ...}."""
+        return {'stages': {name: dict(totals) for name, totals in self.stages.items()}, 'peak_memory_bytes': self.peak_memory()}
+
+    def to_json(self):
+        import json
+        return json.dumps(self.report(), indent=2)
+
+    def to_prometheus(self):
+        """Returns the report in the Prometheus text exposition format."""
+        report = self.report()
+        metrics = (
+            ('calls', 'calculator_stage_calls_total', 'Number of times each stage ran.'),
+            ('seconds', 'calculator_stage_seconds_total', 'Wall time spent in each stage, in seconds.'),
+            ('records', 'calculator_stage_records_total', 'Records processed by each stage.'),
+            ('bytes_read', 'calculator_stage_bytes_read_total', 'Bytes read by each stage.'),
+            ('bytes_written', 'calculator_stage_bytes_written_total', 'Bytes written by each stage.'),
+        )
+        lines = []
+        for key, metric, description in metrics:
+            lines.append('# HELP ' + metric + ' ' + description)
+            lines.append('# TYPE ' + metric + ' counter')
+            for name, totals in report['stages'].items():
+                lines.append(metric + '{stage="' + name + '"} ' + repr(totals[key]))
+        if report['peak_memory_bytes'] is not None:
+            lines.append('# HELP calculator_peak_memory_bytes Peak resident memory of the process, in bytes.')
+            lines.append('# TYPE calculator_peak_memory_bytes gauge')
+            lines.append('calculator_peak_memory_bytes ' + str(report['peak_memory_bytes']))
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path, fileFormat=None):
+        """Writes the report to 'path' as 'json' or 'prometheus' (default: prometheus for a .prom file, json otherwise)."""
+        import os
+        if fileFormat is None:
+            fileFormat = 'prometheus' if os.path.splitext(path)[1].lower() == '.prom' else 'json'
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus() if fileFormat == 'prometheus' else self.to_json() + '\n')
+
+    def save_profile(self, path):
+        """Writes the cProfile statistics (readable with the pstats module) if profiling was enabled."""
+        if self._profiler is not None:
+            self._profiler.dump_stats(path)
+
+
+#the instrumentation every hook in this file reports to; off unless enabled
+INSTRUMENTS = Instrumentation()
+
+
+class FileReport:
+    """FileReport keeps the warning report for one species file while it is being streamed.
+        Instead of storing every omitted line index, it keeps running counters for each category
+        and only the first 'sampleSize' line numbers of each, so its memory does not grow with the file."""
+
+    def __init__(self, filename, sampleSize=20):
+        self.filename = filename
+        self.sampleSize = sampleSize
+        self.lines = 0              #total number of lines read
+        self.records = 0            #lines that produced a (species, count) record
+        self.missingComma = 0       #lines omitted because they have no comma
+        self.badCount = 0           #lines omitted because the population data is missing or not a number
+        self.missingName = 0        #lines kept, but with an empty species name filled in with 'N/A'
+        self.digest = None          #SHA-256 of the bytes that were parsed, when Read_Species_File was asked to hash them
+        self.missingCommaLines = []
+        self.badCountLines = []
+        self.missingNameLines = []
+
+    def omitted(self):
+        """Returns the total number of lines that were omitted for every reason."""
+        return self.missingComma + self.badCount
+
+    def record(self, category, lineIndex):
+        """Counts a problem line in 'category' ('missingComma', 'badCount' or 'missingName') and keeps its index if the sample is not full yet."""
+        setattr(self, category, getattr(self, category) + 1)
+        sample = getattr(self, category + 'Lines')
+        if len(sample) < self.sampleSize:
+            sample.append(lineIndex)
+
+    def _sample(self, lines, count):
+        #shows the kept line numbers, followed by how many more were not kept
+        if count > len(lines):
+            return str(lines) + ' (and ' + str(count - len(lines)) + ' more)'
+        return str(lines)
+
+    def print_report(self):
+        """Prints the warning report in the same form File_Input always has. Nothing is printed if every line was loaded cleanly."""
+        if self.lines == 0:
+            print("WARNING!")
+            print(self.filename, " is an empty file")
+            return
+        if self.omitted() == 0 and self.missingName == 0:
+            return
+        print(" --------- WARNING REPORT ---------")
+        if self.omitted() == self.lines:
+            print(self.filename, " does not have any useful data to load")
+            print("of the ", self.lines, "lines in the file, all of them are omitted.")
+        elif self.omitted() > 0:
+            print("of the ", self.lines, "line(s) in the file, ", self.omitted(), " line(s) are omitted.")
+        if self.badCount > 0: print("Omitted line(s) ", self._sample(self.badCountLines, self.badCount), " has/have missing or invalid population data")
+        if self.missingComma > 0: print("Omitted line(s) ", self._sample(self.missingCommaLines, self.missingComma), " has/have missing comma")
+        if self.missingName > 0 and self.omitted() < self.lines:
+            print("Line(s) ", self._sample(self.missingNameLines, self.missingName), "have missing species name, thus filled in with 'N/A'.")
+
+
+def _Hashing_File(filename, digest):
+    #a text file whose every byte read is fed into 'digest', so the hash is of exactly the bytes that were parsed
+    import io
+
+    class HashingFile(io.RawIOBase):
+        def readinto(self, buffer):
+            n = raw.readinto(buffer)
+            digest.update(memoryview(buffer)[:n])
+            return n
+
+        def readable(self):
+            return True
+
+        def close(self):
+            raw.close()
+            super().close()
+
+    raw = io.FileIO(filename, 'r')
+    return io.TextIOWrapper(io.BufferedReader(HashingFile()))
+
+
+def Read_Species_File(filename, report=None, chunkSize=None, hashed=False):
+    """Read_Species_File is a generator that streams a species file one line at a time.
+        Inputs: 'filename' - path of a file of 'Name, count' lines.
+                'report' - optional FileReport that collects the omitted-line counters; one is created if not given.
+                'chunkSize' - if given, records are yielded as lists of up to chunkSize records instead of one at a time.
+                'hashed' - if True, the SHA-256 of the bytes read is put in report.digest once the whole file is read.
+        Purpose: parses each line once, rounding the population data the same way File_Input does, without ever holding
+                 the whole file in memory. Lines are numbered from 0 in the report, like File_Input's warning report.
+        Returns: yields (speciesName, count) tuples, or lists of them when chunkSize is given.
+                 Raises FileNotFoundError (on the first next()) if the file is not there."""
+    if report is None:
+        report = FileReport(filename)
+    chunk = []
+    if hashed:
+        import hashlib
+        digest = hashlib.sha256()
+        f = _Hashing_File(filename, digest)
+    else:
+        f = open(filename, 'r')
+    with f:
+        for i, line in enumerate(f):
+            report.lines += 1
+            name, comma, rest = line.partition(',')            #split only once: name before the first comma, everything else after it
+            if not comma:
+                report.record('missingComma', i)
+                continue
+            try:
+                count = round(float(rest.split(',', 1)[0].strip()), 0)  #population data is the field right after the first comma
+            except(ValueError):
+                report.record('badCount', i)
+                continue
+            name = name.strip()
+            if name == '':
+                report.record('missingName', i)
+                name = 'N/A'
+            report.records += 1
+            if chunkSize is None:
+                yield name, count
+            else:
+                chunk.append((name, count))
+                if len(chunk) >= chunkSize:
+                    yield chunk
+                    chunk = []
+    if hashed:
+        report.digest = digest.hexdigest()
+    if chunk:
+        yield chunk
+
+
 def File_Input(siteChoice):
     #Code by Jing Wang
 
     #initializing filename as empty list
     filename = ''
-    file_A = 'LindsaySpecies.txt'
-    file_B = 'SquamishSpecies.txt'
-    # A is for LindsaySpecies.txt, B is for SquamishSpecies.txt
-    if siteChoice.capitalize() == 'A':
-        filename = file_A
-    elif siteChoice.capitalize() == 'B':
-        filename = file_B
+    # A is for LindsaySpecies.txt, B is for SquamishSpecies.txt (see SITE_FILES)
+    if siteChoice.capitalize() in SITE_FILES:
+        filename = SITE_FILES[siteChoice.capitalize()]
     
     
     #initializing data list.
     data = []
     speciesNames = []
-    #Try opening file to read
+    report = FileReport(filename)
+    #Try streaming the file; only the loaded records are kept, the omitted lines are counted in report
     try:
-        f1 = open(filename, 'r')    #Open the file to read, if it opens, i means the file is there.
-        filedata = f1.readlines()   #readlines() reads all the lines
-        f1.close                    #close the file
+        with INSTRUMENTS.stage('input') as stage:
+            for species, count in Read_Species_File(filename, report):
+                speciesNames.append(species)
+                data.append(count)
+            stage.add(records=report.records)
+            stage.add_file(filename)
     except(FileNotFoundError):          #This exception is for if the file is not in directory, main() will terminate
         print("WARNING!")
         print(filename," not found in directory, please make sure it's there")  
         speciesNames = "Invalid"        
         data = "Invalid"                #Load data and speciesName as "Invalid" to trigger a termination in Main()
         return speciesNames, data       #Return and terminate function.
-    
-    #print(filedata)
-    #loading the second column into data list, with each elements as float
-    #print(filedata)
-    if len(filedata) > 0:
-        c = 0           #total count of omitted lines
-        l = []          #all the lines that are omitted for every reasons, only lines with missing or invalid population data are omitted
-        mspnl = []      #for lines that have missing/empty specie names
-        mcl = []        #for lines that are missing comma
-        mdl = []        #for original file lines that has missing or invalid population data
-        for i in range(len(filedata)): 
-            if ',' in filedata[i]:                          #this if statement picks only the lines with a comma in it.
-                templine = filedata[i].strip()                  #Strips leading and trailing unuseful chars and load it in templine
-                tempspecies = templine.split(",")[0].strip()    #Split the line by comma and strip the first element and load it in tempspecies
-                tempdata = templine.split(",")[1].strip()       #Split the line by comma and strip the second element and load it in tempdata
-                #error handling for invalid population data:
-                try:
-                    tempdata = float(tempdata)              #try to convert population data from string to float
-                    tempdata = round(tempdata,0)            #try to round population data in tempdata
-                    data.append(tempdata)                   #if the the first 2 tries goes through, proceed to append tempdata to data
-                    #loading specie name stored in tempspecies to speciesNames (output one).
-                    if tempspecies != '':
-                        speciesNames.append(tempspecies)    #if none empty then just append.
-                    else:
-                        mspnl.append(i)                     #if it is empty, record this line index
-                        speciesNames.append('N/A')          #Put down "N/A" in specieNames (output one)
-                except(ValueError):             #this exception is handles lines with invalid population data input, that include non-numeric entries and empty entries
-                    mdl.append(i)               #record this line in mdl, aka the list of lines with missing/invalid populattion data        
-                    l.append(i)                 #record this line in l, aka the list of lines omitted
-                    c = c+1                     #increment total count of omitted lines
-            else:                           #lines without comma:
-                mcl.append(i)               #record this line in mcl, aka the list of lines with missing comma.
-                l.append(i)                 #record this line in l, aka the list of lines omitted
-                c = c+1                     #increment total count of omitted lines
-        if c == len(filedata):              #This condition is for a failure to load any useful data because every line is no good, main() will terminate.
-            #displaying warning report
-            print(" --------- WARNING REPORT ---------")
-            print(filename, " does not have any useful data to load")
-            print("of the ", len(filedata), "lines in the file, all of them are omitted.")
-            if len(mdl)>0: print("Omitted line(s) ", mdl," has/have missing or invalid population data")
-            if len(mcl)>0: print("Omitted line(s) ", mcl," has/have missing comma")
-            speciesNames = "Invalid"
-            data = "Invalid"
-        elif c > 0:                     #This condition is for a failure to load some of the file data because some lines are no good, main() will NOT terminate.
-            #displaying warning report
-            print(" --------- WARNING REPORT ---------")
-            print("of the ", len(filedata), "line(s) in the file, line(s) ", l, " are omitted.")
-            if len(mdl)>0: print("Omitted line(s) ", mdl," has/have missing or invalid population data")
-            if len(mcl)>0: print("Omitted line(s) ", mcl," has/have missing comma")
-            if len(mspnl)>0: print("Line(s) ", mspnl, "have missing species name, thus filled in with 'N/A'.")
-    else:                               #This condition is for an empty input file, main() will terminate
-        print("WARNING!")
-        print(filename, " is an empty file")
+
+    report.print_report()
+    if report.records == 0:             #This condition is for an empty file or a file where every line is no good, main() will terminate.
         speciesNames = "Invalid"
         data = "Invalid"
     return speciesNames, data
 
+def Site_Registry(source=None):
+    """Site_Registry builds the list of sites that the bulk loader should read.
+        Inputs: 'source' - None for the two predetermined sites in SITE_FILES,
+                a directory, in which case every *.txt file is a site named after the file (without the extension),
+                or a manifest file with one 'site name, path' line per site (paths are relative to the manifest;
+                blank lines and lines starting with '#' are skipped, and a line with only a path is named after the file).
+        Returns: a dictionary mapping each site name to the path of its species file, in a stable (sorted) order."""
+    import os
+
+    if source is None:
+        return dict(SITE_FILES)
+    registry = {}
+    if os.path.isdir(source):
+        for entry in sorted(os.listdir(source)):
+            path = os.path.join(source, entry)
+            if entry.endswith('.txt') and os.path.isfile(path):
+                registry[os.path.splitext(entry)[0]] = path
+        return registry
+    baseDir = os.path.dirname(source)
+    with open(source, 'r') as manifest:
+        for line in manifest:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            site, comma, path = line.partition(',')
+            if not comma:                                   #a bare path: name the site after the file
+                path = site
+                site = os.path.splitext(os.path.basename(path))[0]
+            site, path = site.strip(), path.strip()
+            if site in registry:
+                raise ValueError('site ' + site + ' is listed more than once in ' + source)
+            registry[site] = os.path.join(baseDir, path)
+    return dict(sorted(registry.items()))
+
+
+def Load_Site_File(filename, hashed=False):
+    """Load_Site_File reads one species file without printing anything, so it can run inside a worker process.
+        With 'hashed', report.digest is the SHA-256 of the bytes that were parsed (see Read_Species_File).
+        Returns: a tuple (speciesNames, data, report) where report is the FileReport of the file.
+                 Raises ValueError if the file has no usable lines, the same case where File_Input returns "Invalid"."""
+    report = FileReport(filename)
+    speciesNames = []
+    data = []
+    for species, count in Read_Species_File(filename, report, hashed=hashed):
+        speciesNames.append(species)
+        data.append(count)
+    if report.records == 0:
+        if report.lines == 0:
+            raise ValueError(filename + ' is an empty file')
+        raise ValueError(filename + ' does not have any useful data to load')
+    return speciesNames, data, report
+
+
+def Load_Sites(registry, workers=None, hashed=False):
+    """Load_Sites reads the species file of every site in a registry, spreading the files over a pool of processes.
+        Inputs: 'registry' - dictionary of site name to file path, as returned by Site_Registry.
+                'workers' - number of worker processes (default: one per core); 0 or 1 reads every file in this process.
+                'hashed' - True to hash every file while it is parsed, as Load_Site_File does.
+        Purpose: a file that is missing or has no usable data is reported as a failure and does not stop the other sites.
+        Returns: a tuple (results, failures). 'results' maps each site to (speciesNames, data, report), ready for the
+                 index functions; 'failures' maps each failed site to a message describing what went wrong.
+                 Both dictionaries follow the order of the registry."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    loaded = {}
+    errors = {}
+    with INSTRUMENTS.stage('input') as stage:
+        if workers is not None and workers <= 1:
+            for site, path in registry.items():
+                try:
+                    loaded[site] = Load_Site_File(path, hashed)
+                except(OSError, ValueError) as error:
+                    errors[site] = str(error)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {site: pool.submit(Load_Site_File, path, hashed) for site, path in registry.items()}
+                for site, future in futures.items():
+                    try:
+                        loaded[site] = future.result()
+                    except Exception as error:              #any failure in a worker is reported for that site only
+                        errors[site] = str(error)
+        if stage.enabled:
+            for site, (speciesNames, data, report) in loaded.items():
+                stage.add(records=report.records)
+                stage.add_file(registry[site])
+    results = {site: loaded[site] for site in registry if site in loaded}
+    failures = {site: errors[site] for site in registry if site in errors}
+    return results, failures
+
+
+#index names accepted by compute() and the command line, and the result values each one produces.
+#'hill' gives Hill numbers of order 0, 1 and 2; any other order q can be asked for as 'hill_<q>', e.g. 'hill_0.5'.
+INDEX_RESULTS = {
+    'shannon': ('shannon', 'equitability'),
+    'equitability': ('shannon', 'equitability'),
+    'simpson': ('simpson',),
+    'inverse_simpson': ('inverse_simpson',),
+    'berger_parker': ('berger_parker',),
+    'chao1': ('chao1',),
+    'richness': ('richness',),
+    'hill': ('hill_0', 'hill_1', 'hill_2'),
+    'all': ('shannon', 'equitability', 'simpson', 'inverse_simpson', 'berger_parker', 'chao1', 'richness', 'hill_0', 'hill_1', 'hill_2'),
+}
+
+
+def Index_Columns(indices):
+    """Index_Columns turns a list (or comma-separated string) of index names into the result values they produce, in order.
+        Raises ValueError for an unknown index name."""
+    if isinstance(indices, str):
+        indices = indices.split(',')
+    columns = []
+    for name in indices:
+        name = name.strip().lower()
+        if name == '':
+            continue
+        if name in INDEX_RESULTS:
+            names = INDEX_RESULTS[name]
+        elif name.startswith('hill_'):
+            try:
+                names = ('hill_' + format(float(name[5:]), 'g'),)
+            except(ValueError):
+                raise ValueError('the order of ' + repr(name) + ' is not a number')
+        else:
+            raise ValueError('unknown index ' + repr(name) + ', choose from ' + ', '.join(INDEX_RESULTS) + ' or hill_<q>')
+        for column in names:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def compute(data, indices=('shannon', 'simpson')):
+    """compute is the library entry point: it calculates the requested indices for one site without any prompts or printing.
+        Inputs: 'data' - a list of the number of individuals per species. Zero or negative counts are treated as absent species.
+                'indices' - names from INDEX_RESULTS (or 'hill_<q>'), either as a list or as a comma-separated string such as 'shannon,simpson'.
+        Purpose: every index comes from one Diversity_Profile pass over the data, so asking for more indices costs almost nothing.
+        Returns: a dictionary of result name to value. Values that cannot be computed for this data
+                 (equitability of a single species, Simpson's index of fewer than two species) are NaN.
+                 Raises ValueError for an unknown index name or when no species has any individuals."""
+    columns = Index_Columns(indices)
+    orders = [float(column[5:]) for column in columns if column.startswith('hill_')]
+    profile = Diversity_Profile(data, q=orders)
+    return {column: profile[column] for column in columns}
+
+
+def Compute_Sites(siteData, indices=('shannon', 'simpson')):
+    """Compute_Sites runs compute() over every site loaded by Load_Sites, all in the current process.
+        Inputs: 'siteData' - dictionary of site name to (speciesNames, data, ...) as returned by Load_Sites.
+        Returns: a tuple (results, failures): results maps each site to its compute() dictionary,
+                 failures maps each site that could not be scored to the reason."""
+    results = {}
+    failures = {}
+    with INSTRUMENTS.stage('compute') as stage:
+        for site, loaded in siteData.items():
+            try:
+                results[site] = compute(loaded[1], indices)
+            except(ValueError, ArithmeticError) as error:   #one site that cannot be scored must not stop the run
+                failures[site] = str(error)
+        stage.add(records=len(results))
+    return results, failures
+
+
+#part of every cache key; change it whenever a change to the calculator would change cached results
+CACHE_VERSION = 1
+
+
+class ResultCache:
+    """ResultCache remembers the index results of site files on disk (in an SQLite database), so files that have not
+        changed since the last run are neither read nor recomputed.
+        Results are keyed by a SHA-256 hash of the file contents plus the list of requested result values, so a changed
+        file gets a new key and is recomputed automatically. The hash is worked out while the file is parsed, over the
+        very bytes that are parsed, so results are never stored under the hash of other contents.
+        A second table remembers the size, modification time and hash of every path read; while the size and
+        modification time of a file are unchanged, its hash is taken from there, which makes a re-run over an unchanged
+        directory little more than one stat() per file. A file modified less than RACY_SECONDS before it was read is not
+        remembered, because a change made within the resolution of its time stamp would go unnoticed.
+        A third table can also keep the species names and counts of a file (see put_counts), for runs that write the
+        counts table and so need them for cached sites too; they are removed with the last result of their file.
+        At most 'maxEntries' results are kept; the least recently used are evicted first. Call close() (or use it as
+        a context manager) to save the changes."""
+
+    RACY_SECONDS = 2            #coarsest modification time resolution of common file systems (FAT)
+
+    def __init__(self, path, maxEntries=100000):
+        import sqlite3
+        self.path = path
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self.bytesRead = 0          #bytes of cached payloads read from and written to the database
+        self.bytesWritten = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS results (digest TEXT, request TEXT, payload TEXT, used INTEGER, PRIMARY KEY (digest, request))')
+        self._db.execute('CREATE TABLE IF NOT EXISTS counts (digest TEXT PRIMARY KEY, payload TEXT)')
+        self._clock = self._db.execute('SELECT COALESCE(MAX(used), 0) FROM results').fetchone()[0]   #last-use counter for LRU eviction
+
+    def file_digest(self, filename):
+        """Returns a tuple (digest, state): the remembered content hash of a file, or None if the file is new or its size
+            or modification time changed since; and the current state of the file, to hand to remember() once the
+            file has been read and hashed. Nothing is read but the file's stat(). Raises OSError if it is missing."""
+        import os
+        import time
+        info = os.stat(filename)
+        state = (info.st_size, info.st_mtime_ns, time.time_ns())
+        row = self._db.execute('SELECT size, mtime, digest FROM files WHERE path = ?', (os.path.abspath(filename),)).fetchone()
+        if row is not None and row[0] == info.st_size and row[1] == info.st_mtime_ns:
+            return row[2], state
+        return None, state
+
+    def remember(self, filename, state, digest):
+        """Remembers 'digest' as the content hash of a file that file_digest() found in 'state' before it was read.
+            Nothing is remembered if the file changed since, or had been modified less than RACY_SECONDS before."""
+        import os
+        info = os.stat(filename)
+        size, mtime, seen = state
+        if (info.st_size, info.st_mtime_ns) != (size, mtime) or seen - mtime < self.RACY_SECONDS * 10**9:
+            return
+        self._db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (os.path.abspath(filename), size, mtime, digest))
+
+    def get(self, digest, request):
+        """Returns the cached payload for a file hash and request key, or None if it is not cached (always the case
+            for a None hash)."""
+        import json
+        row = self._db.execute('SELECT payload FROM results WHERE digest = ? AND request = ?', (digest, request)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.bytesRead += len(row[0])
+        self._clock += 1
+        self._db.execute('UPDATE results SET used = ? WHERE digest = ? AND request = ?', (self._clock, digest, request))
+        return json.loads(row[0])
+
+    def put(self, digest, request, payload):
+        """Stores a payload (anything JSON can hold, NaN included) for a file hash and request key."""
+        import json
+        payload = json.dumps(payload)
+        self.bytesWritten += len(payload)
+        self._clock += 1
+        self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (digest, request, payload, self._clock))
+
+    def get_counts(self, digest):
+        """Returns the cached (species names, counts) of a file hash, or None (counted as a miss) if they are not cached
+            (always the case for a None hash)."""
+        import json
+        row = self._db.execute('SELECT payload FROM counts WHERE digest = ?', (digest,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.bytesRead += len(row[0])
+        speciesNames, data = json.loads(row[0])
+        return speciesNames, data
+
+    def put_counts(self, digest, speciesNames, data):
+        """Stores the species names and counts of a file hash."""
+        import json
+        payload = json.dumps([list(speciesNames), list(data)])
+        self.bytesWritten += len(payload)
+        self._db.execute('INSERT OR REPLACE INTO counts VALUES (?, ?)', (digest, payload))
+
+    def evict(self):
+        """Removes the least recently used results above maxEntries, and the remembered hashes and counts no result uses
+            any more."""
+        count = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        if count > self.maxEntries:
+            self._db.execute('DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY used LIMIT ?)', (count - self.maxEntries,))
+            self._db.execute('DELETE FROM files WHERE digest NOT IN (SELECT digest FROM results)')
+            self._db.execute('DELETE FROM counts WHERE digest NOT IN (SELECT digest FROM results)')
+
+    def close(self):
+        """Evicts old results, saves every change and closes the database."""
+        self.evict()
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def Score_Sites(registry, indices=('shannon', 'simpson'), cache=None, workers=0, withCounts=False):
+    """Score_Sites reads and scores every site in a registry, using a ResultCache when one is given.
+        Inputs: 'registry' - dictionary of site name to file path; 'indices' - as for compute();
+                'cache' - an open ResultCache, or None to always read the files; 'workers' - as for Load_Sites;
+                'withCounts' - True if the species names and counts of every site are needed, not only its results.
+        Purpose: sites whose file hash and requested indices are in the cache are answered from it without reading
+                 the file; every other site is loaded (and hashed in the same read) with Load_Sites, scored with
+                 compute() and added to the cache under the hash of the bytes that were parsed.
+                 With 'withCounts', the species counts are kept in the cache as well, and a cached site whose counts
+                 are not there yet (it was cached by a run without 'withCounts') is read again.
+        Returns: a tuple (results, failures, siteData). 'results' maps each scored site to
+                 (number of species, number of individuals, compute() dictionary), in registry order;
+                 'failures' maps each failed site to the reason; 'siteData' holds the Load_Sites data of the sites
+                 that were read in this run, and with 'withCounts' also (species names, counts, None) for the cached
+                 sites."""
+    columns = Index_Columns(indices)
+    request = str(CACHE_VERSION) + ':' + ','.join(sorted(columns))
+    scored = {}
+    failures = {}
+    states = {}
+    toLoad = {}
+    cachedData = {}
+    #the cache stage covers stat() and the database; the files themselves are read and hashed in the input stage
+    read = cache.bytesRead if cache is not None else 0
+    with INSTRUMENTS.stage('cache') as stage:
+        for site, path in registry.items():
+            if cache is None:
+                toLoad[site] = path
+                continue
+            try:
+                digest, states[site] = cache.file_digest(path)
+            except(OSError) as error:
+                failures[site] = str(error)
+                continue
+            counts = cache.get_counts(digest) if withCounts else None
+            payload = None if withCounts and counts is None else cache.get(digest, request)
+            if payload is None:
+                toLoad[site] = path
+            else:
+                if withCounts:
+                    cachedData[site] = (counts[0], counts[1], None)
+                scored[site] = (payload['species'], payload['individuals'], {column: payload['results'][column] for column in columns})
+        stage.add(records=len(scored), bytesRead=cache.bytesRead - read if cache is not None else 0)
+
+    siteData, loadFailures = Load_Sites(toLoad, workers, hashed=cache is not None)
+    failures.update(loadFailures)
+    computed, scoreFailures = Compute_Sites(siteData, columns)
+    failures.update(scoreFailures)
+    for site, values in computed.items():
+        data = siteData[site][1]
+        scored[site] = (len(data), sum(data), values)
+    if cache is not None and computed:
+        written = cache.bytesWritten
+        with INSTRUMENTS.stage('cache') as stage:
+            for site in computed:
+                speciesCount, individuals, values = scored[site]
+                digest = siteData[site][2].digest
+                cache.put(digest, request, {'species': speciesCount, 'individuals': individuals, 'results': values})
+                if withCounts:
+                    cache.put_counts(digest, siteData[site][0], siteData[site][1])
+                try:
+                    cache.remember(registry[site], states[site], digest)
+                except(OSError):
+                    pass                                #the file is gone again; it is simply hashed next time
+            stage.add(bytesWritten=cache.bytesWritten - written)
+    siteData.update(cachedData)
+    results = {site: scored[site] for site in registry if site in scored}
+    return results, {site: failures[site] for site in registry if site in failures}, siteData
+
+
+def Convert_Species_Files(registry, directory, dtype='uint32'):
+    """Convert_Species_Files is the 'convert once' tool: it turns the 'Name, count' text files of a registry into a
+        CountStore directory, so later runs read fixed-width integers instead of parsing and rounding text again.
+        Inputs: 'registry' - dictionary of site name to file path; 'directory' - where the store is created;
+                'dtype' - the NumPy integer type of the counts (default uint32, 4 bytes per count).
+        Purpose: the files are streamed twice, one line at a time, so memory does not grow with their size: the first
+                 pass collects the species names of every site, the second writes each site's row of the matrix.
+                 A species listed more than once in a file has its counts added together. A file that changes between
+                 the two passes (a new species, or a count that no longer fits) is left out like any other failure.
+        Returns: a tuple (store, failures): the opened CountStore and a dictionary of site name to the reason a file
+                 was left out (missing file, no usable data, counts that do not fit in 'dtype', or a changed file)."""
+    import os
+    import numpy as np
+
+    limits = np.iinfo(dtype)
+    columns = {}                                        #species name -> column of the matrix
+    failures = {}
+    sites = []
+    for site, path in registry.items():
+        siteColumns = {}
+        report = FileReport(path)
+        try:
+            for species, count in Read_Species_File(path, report):
+                if count < limits.min or count > limits.max:
+                    raise ValueError(path + ' has a count (' + str(count) + ') that does not fit in ' + str(np.dtype(dtype)))
+                siteColumns[species] = siteColumns.get(species, 0) + count
+            if report.records == 0:
+                raise ValueError(path + (' is an empty file' if report.lines == 0 else ' does not have any useful data to load'))
+            if max(siteColumns.values()) > limits.max or min(siteColumns.values()) < limits.min:
+                raise ValueError(path + ' has a species whose total count does not fit in ' + str(np.dtype(dtype)))
+        except(OSError, ValueError) as error:
+            failures[site] = str(error)
+            continue
+        for species in siteColumns:
+            if species not in columns:
+                columns[species] = len(columns)
+        sites.append(site)
+
+    os.makedirs(directory, exist_ok=True)
+    countsPath = os.path.join(directory, 'counts.npy')
+    counts = np.lib.format.open_memmap(countsPath, mode='w+', dtype=dtype, shape=(len(sites), len(columns)))
+    written = []
+    for site in sites:
+        path = registry[site]
+        line = np.zeros(len(columns), dtype=np.float64)
+        try:
+            for species, count in Read_Species_File(path):
+                if species not in columns:
+                    raise ValueError(path + ' changed while it was being converted (' + repr(species) + ' is a new species)')
+                line[columns[species]] += count
+            if line.max() > limits.max or line.min() < limits.min:
+                raise ValueError(path + ' changed while it was being converted (a count no longer fits in ' + str(np.dtype(dtype)) + ')')
+        except(OSError, ValueError) as error:
+            failures[site] = str(error)
+            continue
+        counts[len(written)] = line
+        written.append(site)
+    if len(written) < len(sites):
+        #some files changed between the passes: copy the rows that were written into a matrix of the right size
+        compact = np.lib.format.open_memmap(countsPath + '.tmp', mode='w+', dtype=dtype, shape=(len(written), len(columns)))
+        compact[:] = counts[:len(written)]
+        compact.flush()
+        del compact
+    counts.flush()
+    del counts
+    if len(written) < len(sites):
+        os.replace(countsPath + '.tmp', countsPath)
+        sites = written
+    with open(os.path.join(directory, 'species.txt'), 'w') as f:
+        f.writelines(species + '\n' for species in columns)
+    with open(os.path.join(directory, 'sites.txt'), 'w') as f:
+        f.writelines(site + '\n' for site in sites)
+    return CountStore(directory), {site: failures[site] for site in registry if site in failures}
+
+
+class CountStore:
+    """CountStore opens a binary count store written by Convert_Species_Files. A store is a directory with:
+            counts.npy   - a sites-by-species matrix of fixed-width integer counts (a plain NumPy .npy file)
+            species.txt  - the species name of each column, one per line
+            sites.txt    - the site name of each row, one per line
+        The matrix is memory-mapped, never read whole: one site is one contiguous row, so scoring a site only
+        touches the pages of that row, however large the store is, and scoring many sites reads blocks of
+        neighbouring rows straight into Batch_Profile."""
+
+    def __init__(self, directory):
+        import os
+        import numpy as np
+        self.directory = directory
+        self.counts = np.load(os.path.join(directory, 'counts.npy'), mmap_mode='r')
+        with open(os.path.join(directory, 'species.txt'), 'r') as f:
+            self.species = [line.rstrip('\n') for line in f]
+        with open(os.path.join(directory, 'sites.txt'), 'r') as f:
+            self.sites = [line.rstrip('\n') for line in f]
+        if self.counts.shape != (len(self.sites), len(self.species)):
+            raise ValueError(directory + ' is not a valid count store: the matrix does not match its site and species lists')
+        self._rows = {site: row for row, site in enumerate(self.sites)}
+
+    def row(self, site):
+        """Returns the counts of every species at 'site' as a read-only view into the store (no copy).
+            Raises KeyError if the site is not in the store."""
+        if site not in self._rows:
+            raise KeyError('site ' + repr(site) + ' is not in the store ' + self.directory)
+        return self.counts[self._rows[site]]
+
+    def site_counts(self, site):
+        """Returns (speciesNames, data) of the species present at 'site', in the same form File_Input returns."""
+        import numpy as np
+        line = self.row(site)
+        present = np.flatnonzero(line)
+        return [self.species[j] for j in present], line[present].astype(np.float64).tolist()
+
+    def score(self, site, indices=('shannon', 'simpson')):
+        """Returns the compute() dictionary of one site."""
+        results, failures = self.score_sites(indices, [site])
+        if site not in results:
+            if site not in self._rows:
+                raise KeyError(failures[site])
+            raise ValueError(failures[site])
+        return results[site][2]
+
+    def score_sites(self, indices=('shannon', 'simpson'), sites=None, maxCells=4000000):
+        """Scores 'sites' (default: every site in the store) with Batch_Profile, a block of rows at a time, so that no
+            block has more than 'maxCells' counts (always at least one row). The rows are read straight from the
+            memory-mapped matrix; with the default sites every block is one contiguous slice of the file.
+            Returns: a tuple (results, failures) shaped like Score_Sites: results maps each site to
+                     (number of species, number of individuals, compute() dictionary).
+                     Raises ValueError for an unknown index name."""
+        columns = Index_Columns(indices)
+        orders = [float(column[5:]) for column in columns if column.startswith('hill_')]
+        results = {}
+        failures = {}
+        if sites is None:
+            rows = list(range(len(self.sites)))
+            sites = self.sites
+        else:
+            rows = []
+            for site in sites:
+                if site in self._rows:
+                    rows.append(self._rows[site])
+                else:
+                    failures[site] = 'site ' + repr(site) + ' is not in the store ' + self.directory
+            sites = [site for site in sites if site in self._rows]
+        step = max(1, maxCells // max(1, self.counts.shape[1]))
+        with INSTRUMENTS.stage('compute') as stage:
+            for start in range(0, len(rows), step):
+                block = rows[start:start + step]
+                if block == list(range(block[0], block[0] + len(block))):
+                    counts = self.counts[block[0]:block[-1] + 1]           #a contiguous slice: no index lookups
+                else:
+                    counts = self.counts[block]
+                profile = Batch_Profile(counts, orders)
+                for i, site in enumerate(sites[start:start + step]):
+                    if profile['richness'][i] == 0:
+                        failures[site] = 'no species with a positive number of individuals'
+                        continue
+                    values = {column: profile[column][i].item() for column in columns}
+                    results[site] = (profile['richness'][i].item(), profile['individuals'][i].item(), values)
+                stage.add(records=len(block), bytesRead=counts.nbytes)
+        return results, failures
+
+
+#dissimilarity measures understood by Pairwise_Dissimilarity and Nearest_Sites
+BETA_METRICS = ('braycurtis', 'jaccard', 'morisita_horn')
+
+
+def Site_Matrix(siteData):
+    """Site_Matrix lines the species of many sites up into one sites-by-species matrix.
+        Inputs: 'siteData' - dictionary of site name to (speciesNames, data, ...) as File_Input-style lists or as
+                Load_Sites returns them. A species listed more than once at a site has its counts added together.
+        Returns: a tuple (sites, species, matrix): the site names (rows), the species names (columns, in order of
+                 first appearance) and a float64 NumPy matrix of counts, with 0 where a species was not recorded."""
+    import numpy as np
+
+    columns = {}
+    for loaded in siteData.values():
+        for species in loaded[0]:
+            if species not in columns:
+                columns[species] = len(columns)
+    sites = list(siteData)
+    matrix = np.zeros((len(sites), len(columns)), dtype=np.float64)
+    for row, site in enumerate(sites):
+        speciesNames, data = siteData[site][0], siteData[site][1]
+        np.add.at(matrix[row], [columns[species] for species in speciesNames], data)
+    return sites, list(columns), matrix
+
+
+def Dissimilarity_Tile(A, B, metric='braycurtis', maxCells=4000000):
+    """Dissimilarity_Tile compares every row (site) of A with every row of B; both have the same species columns.
+        'metric' is one of BETA_METRICS:
+            braycurtis    = 1 - 2*sum(min(x, y)) / (sum(x) + sum(y))
+            jaccard       = 1 - (species at both sites) / (species at either site), from presence/absence only
+            morisita_horn = 1 - 2*sum(x*y) / ((dx + dy)*X*Y), where X = sum(x) and dx = sum(x**2)/X**2
+        Bray-Curtis needs min(x, y) for every pair, which is worked out a block of species columns at a time so that
+        no temporary array has more than 'maxCells' values.
+        Returns: a len(A) x len(B) float64 array; pairs where the measure is undefined (empty sites) are NaN."""
+    import numpy as np
+
+    A = np.asarray(A, dtype=np.float64)
+    B = np.asarray(B, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if metric == 'braycurtis':
+            shared = np.zeros((len(A), len(B)))
+            step = max(1, maxCells // max(1, len(A) * len(B)))
+            for j in range(0, A.shape[1], step):
+                shared += np.minimum(A[:, None, j:j+step], B[None, :, j:j+step]).sum(axis=2)
+            return 1 - 2 * shared / (A.sum(axis=1)[:, None] + B.sum(axis=1)[None, :])
+        if metric == 'jaccard':
+            presentA = (A > 0).astype(np.float64)
+            presentB = (B > 0).astype(np.float64)
+            both = presentA @ presentB.T
+            either = presentA.sum(axis=1)[:, None] + presentB.sum(axis=1)[None, :] - both
+            return 1 - both / either
+        if metric == 'morisita_horn':
+            totalA = A.sum(axis=1)
+            totalB = B.sum(axis=1)
+            dA = (A * A).sum(axis=1) / totalA ** 2
+            dB = (B * B).sum(axis=1) / totalB ** 2
+            return 1 - 2 * (A @ B.T) / ((dA[:, None] + dB[None, :]) * totalA[:, None] * totalB[None, :])
+    raise ValueError('unknown dissimilarity ' + repr(metric) + ', choose from ' + ', '.join(BETA_METRICS))
+
+
+#the matrix a worker process compares, mapped once per worker by _Beta_Init instead of being sent with every block,
+#and the shared memory block it lives in (kept open for as long as the worker uses the matrix)
+_BETA_MATRIX = None
+_BETA_SHARED = None
+
+
+def _Beta_Share(matrix):
+    #returns (source, shared): where the workers find the matrix without it being pickled, and the shared memory block
+    #to close and unlink after the run (None if the matrix is a whole memory-mapped file, which the workers map too)
+    import os
+    import numpy as np
+    if isinstance(matrix, np.memmap) and matrix.filename is not None and matrix.flags.c_contiguous \
+            and matrix.offset + matrix.nbytes == os.path.getsize(matrix.filename):
+        return ('file', matrix.filename, matrix.offset, matrix.shape, matrix.dtype.str), None
+    from multiprocessing import shared_memory
+    matrix = np.asarray(matrix)
+    shared = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+    np.ndarray(matrix.shape, matrix.dtype, buffer=shared.buf)[...] = matrix
+    return ('shared', shared.name, 0, matrix.shape, matrix.dtype.str), shared
+
+
+def _Beta_Init(source):
+    global _BETA_MATRIX, _BETA_SHARED
+    import numpy as np
+    kind, name, offset, shape, dtype = source
+    if kind == 'file':
+        _BETA_MATRIX = np.memmap(name, dtype=dtype, mode='r', offset=offset, shape=shape)
+    else:
+        from multiprocessing import shared_memory
+        _BETA_SHARED = shared_memory.SharedMemory(name=name)
+        _BETA_MATRIX = np.ndarray(shape, dtype, buffer=_BETA_SHARED.buf)
+
+
+def _Beta_Block(start, stop, metric, tile, k):
+    return _Beta_Rows(_BETA_MATRIX, start, stop, metric, tile, k)
+
+
+def _Beta_Rows(matrix, start, stop, metric, tile, k):
+    #compares rows start:stop with every row, one tile of columns at a time.
+    #with k=None returns the full block of rows; otherwise keeps only the k nearest other sites of each row
+    import numpy as np
+    A = np.asarray(matrix[start:stop], dtype=np.float64)
+    siteCount = matrix.shape[0]
+    if k is None:
+        block = np.empty((stop - start, siteCount))
+        for j in range(0, siteCount, tile):
+            block[:, j:j+tile] = Dissimilarity_Tile(A, matrix[j:j+tile], metric)
+        return block
+    rows = np.arange(stop - start)
+    bestIndex = np.empty((stop - start, 0), dtype=np.intp)
+    bestValue = np.empty((stop - start, 0))
+    for j in range(0, siteCount, tile):
+        values = Dissimilarity_Tile(A, matrix[j:j+tile], metric)
+        values[np.isnan(values)] = np.inf                           #undefined pairs are never the nearest
+        own = np.arange(start, stop) - j                            #a site is not its own neighbour
+        inTile = (own >= 0) & (own < values.shape[1])
+        values[rows[inTile], own[inTile]] = np.inf
+        index = np.concatenate([bestIndex, np.broadcast_to(np.arange(j, j + values.shape[1]), values.shape)], axis=1)
+        value = np.concatenate([bestValue, values], axis=1)
+        if value.shape[1] > k:
+            keep = np.argpartition(value, k - 1, axis=1)[:, :k]
+            index = np.take_along_axis(index, keep, axis=1)
+            value = np.take_along_axis(value, keep, axis=1)
+        bestIndex, bestValue = index, value
+    order = np.argsort(bestValue, axis=1, kind='stable')
+    return np.take_along_axis(bestIndex, order, axis=1), np.take_along_axis(bestValue, order, axis=1)
+
+
+def _Beta_Run(matrix, metric, tile, workers, k):
+    #splits the rows into blocks of 'tile' rows and runs them in this process or in a pool of worker processes.
+    #the workers do not get a pickled copy of the matrix: they map the same .npy file, or one shared memory copy of it
+    from concurrent.futures import ProcessPoolExecutor
+    if metric not in BETA_METRICS:
+        raise ValueError('unknown dissimilarity ' + repr(metric) + ', choose from ' + ', '.join(BETA_METRICS))
+    blocks = [(start, min(start + tile, matrix.shape[0])) for start in range(0, matrix.shape[0], tile)]
+    if workers is not None and workers <= 1:
+        return [_Beta_Rows(matrix, start, stop, metric, tile, k) for start, stop in blocks]
+    source, shared = _Beta_Share(matrix)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_Beta_Init, initargs=(source,)) as pool:
+            futures = [pool.submit(_Beta_Block, start, stop, metric, tile, k) for start, stop in blocks]
+            return [future.result() for future in futures]
+    finally:
+        if shared is not None:
+            shared.close()
+            shared.unlink()
+
+
+def Pairwise_Dissimilarity(matrix, metric='braycurtis', tile=256, workers=None):
+    """Pairwise_Dissimilarity compares every pair of sites.
+        Inputs: 'matrix' - a sites-by-species count matrix, e.g. from Site_Matrix or CountStore.counts;
+                'metric' - one of BETA_METRICS; 'tile' - sites per block, small enough for a block to stay in cache;
+                'workers' - number of processes (default: one per core); 0 or 1 runs in this process.
+        Returns: the full sites x sites dissimilarity matrix (0 on the diagonal for non-empty sites).
+                 For many thousands of sites use Nearest_Sites, which never holds the whole matrix."""
+    import numpy as np
+    if matrix.shape[0] == 0:
+        return np.empty((0, 0))
+    return np.concatenate(_Beta_Run(matrix, metric, tile, workers, None), axis=0)
+
+
+def Nearest_Sites(matrix, k=10, metric='braycurtis', tile=256, workers=None):
+    """Nearest_Sites finds the k most similar other sites of every site without building the sites x sites matrix:
+        each block of 'tile' sites is compared with the others one tile at a time, keeping only its k best so far,
+        so memory depends on the tile size and k, not on the number of sites squared.
+        Inputs: as for Pairwise_Dissimilarity, plus 'k' - neighbours per site (at most the number of sites - 1).
+        Returns: a tuple (neighbours, dissimilarities) of sites x k arrays, nearest first. 'neighbours' holds row
+                 numbers of 'matrix'; a site with fewer than k comparable neighbours has inf dissimilarities at the end."""
+    import numpy as np
+    k = min(k, matrix.shape[0] - 1)
+    if k < 1:
+        return np.empty((matrix.shape[0], 0), dtype=np.intp), np.empty((matrix.shape[0], 0))
+    parts = _Beta_Run(matrix, metric, tile, workers, k)
+    return np.concatenate([part[0] for part in parts], axis=0), np.concatenate([part[1] for part in parts], axis=0)
+
+
+def Score_Vectors(vectors):
+    """Score_Vectors scores a batch of count vectors with one Batch_Index call; it is the job the scoring service
+        sends to its worker pool.
+        Returns: a list with one dictionary {'shannon', 'equitability', 'simpson'} per vector, where values
+                 that cannot be computed are None (JSON has no NaN)."""
+    import math
+    import numpy as np
+
+    offsets = np.zeros(len(vectors) + 1, dtype=np.intp)
+    offsets[1:] = np.cumsum([len(vector) for vector in vectors])
+    flat = np.fromiter((value for vector in vectors for value in vector), dtype=np.float64, count=int(offsets[-1]))
+    ShannonIndex, EquitabilityIndex, SimpsonsIndex = Batch_Index(flat, offsets)
+    results = []
+    for i in range(len(vectors)):
+        row = {'shannon': float(ShannonIndex[i]), 'equitability': float(EquitabilityIndex[i]), 'simpson': float(SimpsonsIndex[i])}
+        results.append({name: (None if math.isnan(value) else value) for name, value in row.items()})
+    return results
+
+
+def _Parse_Counts(body, key):
+    #reads and checks one count vector (key 'counts') or a list of them (key 'sites') from a JSON body.
+    #every count must be a finite, non-negative number that fits in a float, so nothing invalid is ever queued
+    import json
+    import math
+    try:
+        request = json.loads(body)
+    except(ValueError):
+        raise ValueError('the body is not valid JSON')
+    vectors = request.get(key) if isinstance(request, dict) else None
+    if key == 'counts':
+        vectors = [vectors]
+    if not isinstance(vectors, list) or len(vectors) == 0:
+        raise ValueError('the body must be a JSON object with a non-empty "' + key + '" list')
+    for vector in vectors:
+        if not isinstance(vector, list) or len(vector) == 0 or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in vector):
+            raise ValueError('every count vector must be a non-empty list of numbers')
+        for value in vector:
+            try:
+                finite = math.isfinite(float(value))
+            except(OverflowError):
+                finite = False
+            if not finite:
+                raise ValueError('count ' + (repr(value) if isinstance(value, float) else 'of ' + str(len(str(value))) + ' digits') + ' is not a finite number')
+            if value < 0:
+                raise ValueError('count ' + repr(value) + ' is negative')
+    return vectors
+
+
+def _Score_Body(body):
+    #the job of a /batch request: the body is parsed, checked and scored in the worker pool, not on the event loop
+    return Score_Vectors(_Parse_Counts(body, 'sites'))
+
+
+def _Percentile(values, fraction):
+    #nearest-rank percentile of a list of numbers, None for an empty list
+    import math
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class ScoringService:
+    """ScoringService is a small asyncio HTTP/1.1 server that scores count vectors for other programs.
+        Endpoints (JSON in, JSON out):
+            POST /shannon   {"counts": [...]}          -> {"shannon": H, "equitability": E}
+            POST /simpson   {"counts": [...]}          -> {"simpson": D}
+            POST /score     {"counts": [...]}          -> all three
+            POST /batch     {"sites": [[...], ...]}    -> {"results": [{...}, ...]}, one entry per site
+            GET  /metrics                              -> request counts, throughput and latency percentiles
+            GET  /health                               -> {"status": "ok"}
+        Single-vector requests that arrive close together are micro-batched: they wait at most 'maxDelay' seconds
+        (or until 'maxBatch' are waiting) and are then scored together by Score_Vectors in a worker pool, so the
+        event loop only reads and answers requests and never blocks on the calculation. /batch bodies, and any
+        other body over 'maxInlineBody' bytes, are parsed and checked in the pool as well, since parsing a large
+        body takes longer than scoring it.
+        'pool' is 'process' (default) or 'thread', or an existing concurrent.futures executor."""
+
+    def __init__(self, maxBatch=256, maxDelay=0.002, pool='process', workers=None, maxBody=64 * 1024 * 1024, latencyWindow=100000,
+                 maxInlineBody=64 * 1024):
+        import collections
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.maxBody = maxBody
+        self.maxInlineBody = maxInlineBody
+        self._ownPool = pool in ('process', 'thread')     #only a pool the service made is shut down by stop()
+        if pool == 'process':
+            #workers are started when they are first needed; a worker forked from this process then would keep a copy
+            #of every open client socket, and those clients would never see their connection close.
+            #a fork server starts them from a clean process instead (Windows has none, and does not fork either)
+            import multiprocessing
+            context = multiprocessing.get_context('forkserver') if 'forkserver' in multiprocessing.get_all_start_methods() else None
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        elif pool == 'thread':
+            self._pool = ThreadPoolExecutor(max_workers=workers)
+        else:
+            self._pool = pool
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self._server = None
+        #metrics
+        self.started = None
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batchedVectors = 0
+        self.latencies = collections.deque(maxlen=latencyWindow)     #seconds, most recent requests only
+
+    async def score(self, counts):
+        """Scores one count vector through the micro-batcher and returns its Score_Vectors dictionary."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((counts, future))
+        if len(self._pending) >= self.maxBatch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.maxDelay, self._flush)
+        return await future
+
+    async def score_batch(self, vectors):
+        """Scores a whole batch of count vectors in the worker pool, without waiting for other requests."""
+        import asyncio
+        self.batches += 1
+        self.batchedVectors += len(vectors)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, Score_Vectors, vectors)
+
+    async def score_body(self, body):
+        """Parses, checks and scores the JSON body of a /batch request in the worker pool.
+            Raises ValueError if the body is not a valid list of count vectors."""
+        import asyncio
+        results = await asyncio.get_running_loop().run_in_executor(self._pool, _Score_Body, body)
+        self.batches += 1
+        self.batchedVectors += len(results)
+        return results
+
+    def _flush(self):
+        import asyncio
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if len(batch) > 0:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)                       #keeps a reference until the batch is done
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self.score_batch([counts for counts, future in batch])
+        except Exception:
+            #score every vector on its own, so a vector that cannot be scored only fails its own request
+            for counts, future in batch:
+                try:
+                    result = (await self.score_batch([counts]))[0]
+                except Exception as error:
+                    if not future.done():
+                        future.set_exception(error)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            return
+        for (counts, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self):
+        """Returns the service metrics: request and error counts, throughput since start, mean batch size,
+            and the p50/p99 latency in milliseconds over the most recent requests."""
+        import time
+        elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        latencies = list(self.latencies)
+        p50 = _Percentile(latencies, 0.50)
+        p99 = _Percentile(latencies, 0.99)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'uptime_seconds': elapsed,
+            'requests_per_second': self.requests / elapsed if elapsed > 0 else 0.0,
+            'batches': self.batches,
+            'mean_batch_size': self.batchedVectors / self.batches if self.batches > 0 else 0.0,
+            'latency_p50_ms': p50 * 1000 if p50 is not None else None,
+            'latency_p99_ms': p99 * 1000 if p99 is not None else None,
+        }
+
+    async def _route(self, method, path, body):
+        #returns (status code, JSON payload) for one request
+        if method == 'GET' and path == '/metrics':
+            return 200, self.metrics()
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok'}
+        if path not in ('/shannon', '/simpson', '/score', '/batch'):
+            return 404, {'error': 'no such endpoint: ' + path}
+        if method != 'POST':
+            return 405, {'error': path + ' only accepts POST'}
+        import asyncio
+        try:
+            if path == '/batch':
+                return 200, {'results': await self.score_body(body)}
+            if len(body) > self.maxInlineBody:
+                vectors = await asyncio.get_running_loop().run_in_executor(self._pool, _Parse_Counts, body, 'counts')
+            else:
+                vectors = _Parse_Counts(body, 'counts')
+            result = await self.score(vectors[0])
+        except(ValueError) as error:
+            return 400, {'error': str(error)}
+        if path == '/shannon':
+            return 200, {'shannon': result['shannon'], 'equitability': result['equitability']}
+        if path == '/simpson':
+            return 200, {'simpson': result['simpson']}
+        return 200, result
+
+    async def _handle(self, reader, writer):
+        #serves the requests of one connection, keeping it open between requests (HTTP/1.1 keep-alive)
+        import asyncio
+        import json
+        import time
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+                   431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+        try:
+            while True:
+                headers = {}
+                try:
+                    requestLine = await reader.readline()
+                    if not requestLine:
+                        break
+                    start = time.perf_counter()
+                    parts = requestLine.decode('latin-1').split()
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        name, colon, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                except(ValueError):                         #a request line or header longer than the stream limit (64 KiB)
+                    start = time.perf_counter()
+                    parts = None
+                keepAlive = parts is not None and len(parts) == 3 and parts[2] == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                try:
+                    length = int(headers.get('content-length', '0'))
+                except(ValueError):
+                    length = -1
+                if parts is None:
+                    status, payload, keepAlive = 431, {'error': 'the request line or a header is too long'}, False
+                elif len(parts) != 3 or length < 0:
+                    status, payload, keepAlive = 400, {'error': 'malformed request'}, False
+                elif length > self.maxBody:
+                    status, payload, keepAlive = 413, {'error': 'the body is larger than ' + str(self.maxBody) + ' bytes'}, False
+                else:
+                    body = await reader.readexactly(length) if length > 0 else b''
+                    try:
+                        status, payload = await self._route(parts[0].upper(), parts[1].split('?')[0], body)
+                    except Exception as error:           #a failure in one request must not stop the server
+                        status, payload = 500, {'error': str(error)}
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(('HTTP/1.1 ' + str(status) + ' ' + reasons.get(status, '') + '\r\n'
+                              'Content-Type: application/json\r\n'
+                              'Content-Length: ' + str(len(data)) + '\r\n'
+                              'Connection: ' + ('keep-alive' if keepAlive else 'close') + '\r\n\r\n').encode('latin-1') + data)
+                await writer.drain()
+                self.requests += 1
+                if status >= 400:
+                    self.errors += 1
+                self.latencies.append(time.perf_counter() - start)
+                if not keepAlive:
+                    break
+        except(asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8080):
+        """Starts listening and returns the asyncio server (its sockets tell the port when port 0 was asked for)."""
+        import asyncio
+        import time
+        self.started = time.perf_counter()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def stop(self):
+        """Stops listening, finishes the batches in progress and shuts the worker pool down (unless it was handed in)."""
+        import asyncio
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._ownPool:
+            self._pool.shutdown()
+
+
+def Serve(host='127.0.0.1', port=8080, **options):
+    """Serve runs a ScoringService until it is interrupted (Ctrl+C). 'options' are passed to ScoringService."""
+    import asyncio
+
+    async def Run():
+        service = ScoringService(**options)
+        server = await service.start(host, port)
+        print('Scoring service listening on', ', '.join(str(sock.getsockname()[:2]) for sock in server.sockets))
+        try:
+            await server.serve_forever()
+        finally:
+            await service.stop()
+
+    try:
+        asyncio.run(Run())
+    except(KeyboardInterrupt):
+        pass
+    return 0
+
+
+async def Load_Test(host='127.0.0.1', port=8080, requests=10000, concurrency=64, path='/score', species=50, seed=0):
+    """Load_Test is a local load generator for the scoring service: 'concurrency' clients, each on its own keep-alive
+        connection, send 'requests' requests in total with random count vectors of 'species' values.
+        Returns: a dictionary with the number of requests answered and of errors (answers other than 200), the elapsed
+                 time, the throughput and the p50/p99 latency in milliseconds of the successful requests, to compare
+                 against latency targets. The latencies are None when no request succeeded."""
+    import asyncio
+    import json
+    import random
+    import time
+
+    generator = random.Random(seed)
+    bodies = [json.dumps({'counts': [generator.randint(1, 1000) for j in range(species)]}).encode('utf-8') for i in range(min(requests, 1000))]
+    latencies = []
+    answered = 0
+    errors = 0
+    sent = 0
+
+    async def Client():
+        nonlocal answered, errors, sent
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while sent < requests:
+                body = bodies[sent % len(bodies)]
+                sent += 1
+                start = time.perf_counter()
+                writer.write(('POST ' + path + ' HTTP/1.1\r\nHost: ' + host + '\r\nContent-Type: application/json\r\n'
+                              'Content-Length: ' + str(len(body)) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':')[1])
+                await reader.readexactly(length)
+                answered += 1
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(Client() for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': answered,
+        'errors': errors,
+        'seconds': elapsed,
+        'requests_per_second': answered / elapsed if elapsed > 0 else 0.0,
+        'latency_p50_ms': _Percentile(latencies, 0.50) * 1000 if latencies else None,
+        'latency_p99_ms': _Percentile(latencies, 0.99) * 1000 if latencies else None,
+    }
+
+
+def Command_Line(argv=None):
+    """Command_Line is the non-interactive entry point used by 'python -m calculator'.
+        Inputs: 'argv' - the command-line arguments (default: sys.argv[1:]). With no arguments, or with --interactive,
+                the interactive main() program is run instead.
+        Purpose: loads every site named by --input/--manifest, calculates the chosen indices and writes one row per site
+                 to --out (or to the standard output). Problems with individual sites are written to the standard error.
+        Returns: the exit status: 0 when every site was scored, 1 when at least one site failed, 2 for bad arguments."""
+    import argparse
+    import sys
+
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(prog='python -m calculator', description='Calculate biodiversity indices for species data files without prompts.')
+    parser.add_argument('--input', nargs='+', default=[], metavar='PATH', help='species files or directories of *.txt species files')
+    parser.add_argument('--manifest', help="manifest file of 'site name, path' lines")
+    parser.add_argument('--indices', default='shannon,simpson', help='comma-separated indices to calculate (default: shannon,simpson; choices: ' + ', '.join(INDEX_RESULTS) + ', or hill_<q> for a Hill number of order q)')
+    parser.add_argument('--out', help='results file: results.csv writes results_counts.csv and results_indices.csv, results.npz writes compressed NumPy parts results_part00000.npz, ...; existing results are appended to (default: a summary on the standard output)')
+    parser.add_argument('--format', choices=('csv', 'npz'), help='results format (default: taken from the --out extension)')
+    parser.add_argument('--workers', type=int, default=0, help='worker processes for reading files (default: 0, read everything in this process)')
+    parser.add_argument('--cache', metavar='FILE', help='result cache database; files that have not changed since an earlier run are not read again (with --out it also keeps their species counts)')
+    parser.add_argument('--cache-size', type=int, default=100000, help='most results kept in the cache, least recently used are evicted (default 100000)')
+    parser.add_argument('--convert', metavar='STORE', help='convert the --input/--manifest files once into a binary count store directory, then stop')
+    parser.add_argument('--store', metavar='STORE', help='score the sites of a binary count store instead of text files')
+    parser.add_argument('--site', nargs='+', help='with --store, score only these sites')
+    parser.add_argument('--serve', metavar='[HOST:]PORT', help='run the HTTP scoring service instead of scoring files')
+    parser.add_argument('--load-test', metavar='[HOST:]PORT', help='send a load test to a running scoring service and print its latency and throughput')
+    parser.add_argument('--requests', type=int, default=10000, help='requests sent by --load-test (default 10000)')
+    parser.add_argument('--concurrency', type=int, default=64, help='concurrent connections used by --load-test (default 64)')
+    parser.add_argument('--p50-ms', type=float, help='with --load-test, fail if the p50 latency is above this many milliseconds')
+    parser.add_argument('--p99-ms', type=float, help='with --load-test, fail if the p99 latency is above this many milliseconds')
+    parser.add_argument('--metrics-out', metavar='FILE', help='record the time, records, bytes and peak memory of each stage (input, cache, compute, output) and write them to FILE')
+    parser.add_argument('--metrics-format', choices=('json', 'prometheus'), help='format of --metrics-out (default: prometheus for a .prom file, json otherwise)')
+    parser.add_argument('--profile', metavar='FILE', help='run under cProfile and write the statistics to FILE (read them with python -m pstats FILE)')
+    parser.add_argument('--interactive', action='store_true', help='run the interactive program instead')
+    if len(argv) == 0:
+        return main()
+    args = parser.parse_args(argv)
+    if args.metrics_out is None and args.profile is None:
+        return _Run_Command(parser, args)
+    INSTRUMENTS.enable(profile=args.profile is not None)
+    try:
+        return _Run_Command(parser, args)
+    finally:
+        INSTRUMENTS.disable()
+        if args.profile is not None:
+            INSTRUMENTS.save_profile(args.profile)
+        if args.metrics_out is not None:
+            INSTRUMENTS.save(args.metrics_out, args.metrics_format)
+
+
+def _Run_Command(parser, args):
+    #does what the parsed command-line arguments ask for and returns the exit status (see Command_Line)
+    import csv
+    import os
+    import sys
+
+    if args.interactive:
+        return main()
+    if args.serve is not None or args.load_test is not None:
+        import asyncio
+        import json
+        host, colon, port = (args.serve or args.load_test).rpartition(':')
+        host = host or '127.0.0.1'
+        if not port.isdigit():
+            parser.error('the port must be a number')
+        if args.serve is not None:
+            return Serve(host, int(port), workers=args.workers or None)
+        report = asyncio.run(Load_Test(host, int(port), args.requests, args.concurrency))
+        print(json.dumps(report, indent=2))
+        #no successful request at all (latency None) also misses any latency target
+        tooSlow = any(target is not None and (latency is None or latency > target)
+                      for target, latency in ((args.p50_ms, report['latency_p50_ms']), (args.p99_ms, report['latency_p99_ms'])))
+        return 1 if tooSlow or report['errors'] > 0 else 0
+    if len(args.input) == 0 and args.manifest is None and args.store is None:
+        parser.error('give at least one --input, a --manifest or a --store')
+
+    #build one registry from every input: directories are scanned, single files become a site named after the file
+    registry = {}
+    sources = [Site_Registry(args.manifest)] if args.manifest is not None else []
+    for path in args.input:
+        if os.path.isdir(path):
+            sources.append(Site_Registry(path))
+        else:
+            sources.append({os.path.splitext(os.path.basename(path))[0]: path})
+    for source in sources:
+        for site, path in source.items():
+            if site in registry and registry[site] != path:
+                parser.error('site ' + site + ' is given by more than one file')
+            registry[site] = path
+    try:
+        Index_Columns(args.indices)                     #checks the index names before any file is read
+    except(ValueError) as error:
+        parser.error(str(error))
+
+    if args.convert is not None:
+        store, failures = Convert_Species_Files(registry, args.convert)
+        print('Converted', len(store.sites), 'site(s) with', len(store.species), 'species into', args.convert)
+        for site, message in failures.items():
+            print('calculator: site ' + site + ' failed: ' + message, file=sys.stderr)
+        return 1 if len(failures) > 0 else 0
+
+    if args.store is not None:
+        #the counts are already in the store, so only the index results are written to --out
+        results, failures = CountStore(args.store).score_sites(args.indices, args.site)
+        siteData = {}
+    else:
+        cache = ResultCache(args.cache, args.cache_size) if args.cache is not None else None
+        try:
+            results, failures, siteData = Score_Sites(registry, args.indices, cache, args.workers, withCounts=args.out is not None)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    columns = Index_Columns(args.indices)
+    if args.out is not None:
+        #tidy tables of the species counts and the index results, appended to the results file(s)
+        with Open_Results_Writer(args.out, args.format) as writer:
+            for site, (speciesCount, individuals, values) in results.items():
+                if site in siteData:
+                    writer.write_counts(site, siteData[site][0], siteData[site][1])
+                writer.write_indices(site, values)
+    else:
+        #a one-row-per-site summary on the standard output
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['site', 'species', 'individuals'] + columns)
+        for site, (speciesCount, individuals, values) in results.items():
+            writer.writerow([site, speciesCount, individuals] + [values[column] for column in columns])
+    for site, message in failures.items():
+        print('calculator: site ' + site + ' failed: ' + message, file=sys.stderr)
+    return 1 if len(failures) > 0 else 0
+
+
+class ResultsWriter:
+    """ResultsWriter is the base of the results writers. It collects two tidy tables:
+        the counts table (site, species, count), one row per species at each site, and
+        the indices table (site, index, value), one row per calculated index at each site.
+        Rows are buffered in memory and written 'bufferRows' at a time, and an existing results file is always
+        appended to, never rewritten. Use it as a context manager (or call close()) so the last rows are written.
+        Subclasses only implement _write(table, columns), which stores one batch of rows for a table."""
+
+    COLUMNS = {'counts': ('site', 'species', 'count'), 'indices': ('site', 'index', 'value')}
+
+    def __init__(self, path, bufferRows=65536):
+        self.path = path
+        self.bufferRows = bufferRows
+        self._buffers = {table: tuple([] for column in columns) for table, columns in self.COLUMNS.items()}
+
+    def write_counts(self, site, speciesNames, data):
+        """Adds the count of every species of one site to the counts table."""
+        sites, species, counts = self._buffers['counts']
+        sites.extend([site] * len(data))
+        species.extend(speciesNames)
+        counts.extend(data)
+        if len(sites) >= self.bufferRows:
+            self._flushTable('counts')
+
+    def write_indices(self, site, results):
+        """Adds the results of one site, a dictionary of index name to value such as compute() returns, to the indices table."""
+        sites, names, values = self._buffers['indices']
+        for name, value in results.items():
+            sites.append(site)
+            names.append(name)
+            values.append(value)
+        if len(sites) >= self.bufferRows:
+            self._flushTable('indices')
+
+    def _flushTable(self, table):
+        columns = self._buffers[table]
+        if len(columns[0]) > 0:
+            with INSTRUMENTS.stage('output') as stage:
+                stage.add(records=len(columns[0]), bytesWritten=self._write(table, columns))
+            for column in columns:
+                column.clear()
+
+    def _write(self, table, columns):
+        #stores one batch of rows and returns the number of bytes written
+        raise NotImplementedError
+
+    def flush(self):
+        """Writes every buffered row."""
+        for table in self.COLUMNS:
+            self._flushTable(table)
+
+    def close(self):
+        """Writes every buffered row and closes the output file(s)."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvResultsWriter(ResultsWriter):
+    """CsvResultsWriter writes the two tables as csv files next to 'path': results.csv becomes
+        results_counts.csv and results_indices.csv. The header row is only written to a new, empty file."""
+
+    def __init__(self, path, bufferRows=65536):
+        import os
+        super().__init__(path, bufferRows)
+        stem = os.path.splitext(path)[0]
+        self.countsPath = stem + '_counts.csv'
+        self.indicesPath = stem + '_indices.csv'
+        self._files = {}
+        for table, tablePath in (('counts', self.countsPath), ('indices', self.indicesPath)):
+            self._files[table] = open(tablePath, 'a', newline='')
+
+    def _write(self, table, columns):
+        import csv
+        fileOut = self._files[table]
+        writer = csv.writer(fileOut)
+        start = fileOut.tell()
+        if start == 0:
+            writer.writerow(self.COLUMNS[table])
+        writer.writerows(zip(*columns))         #one batched call per buffer instead of one writerow per species
+        return fileOut.tell() - start
+
+    def close(self):
+        super().close()
+        for fileOut in self._files.values():
+            fileOut.close()
+
+
+class NpzResultsWriter(ResultsWriter):
+    """NpzResultsWriter writes the two tables as compressed NumPy archives next to 'path': results.npz becomes
+        results_part00000.npz, results_part00001.npz, ... with one new part per flush of a table.
+        In a part, a text column (site, species, index) is stored as integer codes plus the array of the distinct
+        names (UTF-8), and every array is compressed (ZIP_DEFLATED).
+        A part is written under a temporary name and then published under the next free part number with a hard
+        link, which fails instead of replacing a part that is already there, so appending never touches existing parts
+        (even when several writers share the same path) and a crash can only lose the batch that was being written.
+        Read_Results joins the parts back together."""
+
+    def __init__(self, path, bufferRows=65536):
+        import os
+        super().__init__(path, bufferRows)
+        self._stem = os.path.splitext(path)[0]
+        self.countsPath = self.indicesPath = self._stem + '_part*.npz'
+
+    def _write(self, table, columns):
+        import os
+        import numpy as np
+        arrays = {}
+        for name, values in zip(self.COLUMNS[table], columns):
+            if name in ('count', 'value'):
+                arrays[table + '.' + name] = np.asarray(values, dtype=np.float64)
+                continue
+            codes = {}                                  #name -> code, in order of first appearance
+            arrays[table + '.' + name + '.codes'] = np.fromiter((codes.setdefault(str(value), len(codes)) for value in values), dtype=np.int32, count=len(values))
+            arrays[table + '.' + name + '.names'] = np.array([text.encode('utf-8') for text in codes], dtype=np.bytes_)
+        import glob
+        import tempfile
+        directory, name = os.path.split(self._stem)
+        handle, temporary = tempfile.mkstemp(suffix='.npz.tmp', prefix=name + '_part', dir=directory or '.')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            parts = [_Part_Number(self._stem, part) for part in glob.glob(glob.escape(self._stem) + '_part*.npz')]
+            number = max([number for number in parts if number is not None], default=-1) + 1
+            while True:
+                path = self._stem + '_part' + format(number, '05d') + '.npz'
+                try:
+                    os.link(temporary, path)
+                    break
+                except(FileExistsError):                #another writer took this number first
+                    number += 1
+        finally:
+            os.remove(temporary)
+        return os.path.getsize(path)
+
+
+def _Part_Number(stem, path):
+    #the number of a results part file such as results_part00012.npz, or None for any other file
+    number = path[len(stem) + len('_part'):-len('.npz')]
+    return int(number) if number.isdigit() else None
+
+
+def Open_Results_Writer(path, fileFormat=None, bufferRows=65536):
+    """Open_Results_Writer returns the results writer for 'path'.
+        'fileFormat' is 'csv' or 'npz'; by default it is taken from the extension of path (.npz, anything else is csv)."""
+    import os
+    if fileFormat is None:
+        fileFormat = 'npz' if os.path.splitext(path)[1].lower() == '.npz' else 'csv'
+    if fileFormat == 'npz':
+        return NpzResultsWriter(path, bufferRows)
+    if fileFormat == 'csv':
+        return CsvResultsWriter(path, bufferRows)
+    raise ValueError('unknown results format ' + repr(fileFormat) + ', choose csv or npz')
+
+
+def Read_Results(path, fileFormat=None):
+    """Read_Results loads the tables written by a results writer.
+        Inputs: 'path' - the path given to the writer (e.g. results.csv or results.npz).
+        Returns: a dictionary {'counts': {...}, 'indices': {...}} where each table maps column name to the whole column,
+                 as NumPy arrays for .npz parts and as lists for csv files."""
+    import os
+    if fileFormat is None:
+        fileFormat = 'npz' if os.path.splitext(path)[1].lower() == '.npz' else 'csv'
+    tables = {}
+    if fileFormat == 'npz':
+        import glob
+        import numpy as np
+        stem = os.path.splitext(path)[0]
+        parts = [(_Part_Number(stem, name), name) for name in glob.glob(glob.escape(stem) + '_part*.npz')]
+        parts = sorted(part for part in parts if part[0] is not None)      #by part number, not by name
+        batches = {table: {name: [] for name in columns} for table, columns in ResultsWriter.COLUMNS.items()}
+        for number, partPath in parts:
+            with np.load(partPath, allow_pickle=False) as archive:
+                for table, columns in ResultsWriter.COLUMNS.items():
+                    for name in columns:
+                        key = table + '.' + name
+                        if key in archive.files:
+                            batches[table][name].append(archive[key])
+                        elif key + '.codes' in archive.files:
+                            names = np.char.decode(archive[key + '.names'], 'utf-8')
+                            batches[table][name].append(names[archive[key + '.codes']] if len(names) else np.array([], dtype=np.str_))
+        for table, columns in batches.items():
+            tables[table] = {name: np.concatenate(arrays) if arrays else np.array([]) for name, arrays in columns.items()}
+        return tables
+    import csv
+    stem = os.path.splitext(path)[0]
+    for table, columns in ResultsWriter.COLUMNS.items():
+        tables[table] = {name: [] for name in columns}
+        if not os.path.exists(stem + '_' + table + '.csv'):
+            continue
+        with open(stem + '_' + table + '.csv', 'r', newline='') as fileIn:
+            for row in csv.DictReader(fileIn):
+                for name in columns:
+                    tables[table][name].append(float(row[name]) if name in ('count', 'value') else row[name])
+    return tables
+
+
 def main():
     """The main function displays the program's purpose, allows the user to choose what form of data entry they would like, 
         calls the Manual_Input or File_Input function depending on their choice, and give users the options of indices to calculate.
@@ -231,7 +2269,7 @@ def main():
     print('     whereas Simpson’s index provides a species dominance estimate.')
     print("     Shannon's equitability score will also give a sense of how evenly the species are distributed in the ecological community."      )
     #display how and where the results will be saved
-    print('The results will be saved to a csv file in this directory with a file name of your choice.')
+    print('The results will be saved to two csv files in this directory (species counts and index results) with a file name of your choice.')
     print()
     print()
     #display to the user their data entry options
@@ -286,36 +2324,40 @@ def main():
     print("         Option 1: Calculate Shannon's Diversity Index")
     print("         Option 2: Calculate Simpson's Diversity Index")
     print("         Option 3: Calculate both Shannon's and Simpson's Diversity Indices")
+    print("         Option 4: Calculate the full set of measures (Shannon, Simpson, inverse Simpson, Hill numbers, Berger-Parker and Chao1)")
     print()
     
     #set a variable to control the input while loop
     bioChoice = 'invalid'
-    #prompt the user for a calculation option until they provide one of the three valid choices
+    #prompt the user for a calculation option until they provide one of the four valid choices
     while bioChoice == 'invalid':
-        indexChoice = input('Please enter your biodiversity index choice (1,2 or 3): ')
+        indexChoice = input('Please enter your biodiversity index choice (1,2,3 or 4): ')
         try:
-            if int(indexChoice) > 3 or int(indexChoice) < 1:
+            if int(indexChoice) > 4 or int(indexChoice) < 1:
                 print('You did not enter a valid biodiversity index option. Please try again.')
             else:
                 print('You have chosen option ' + indexChoice)
-                if int(indexChoice) == 1:
-                    ShannonResults = Shannon_Index(data)            #call Shannon_Index function using data as parameter if user selects option 1
-                    #print(ShannonResults)
-                elif int(indexChoice) == 2:
-                    SimpsonResults = Simpson_Index(data)            #call Simpson_Index function using data as parameter if user selects option 2
-                    #print(SimpsonResults)
-                elif int(indexChoice) == 3:
-                    ShannonResults = Shannon_Index(data)            #call both Shannon_Index and Simpson_Index functions using data as parameter if user selects option 3
-                    SimpsonResults = Simpson_Index(data)
-                    #print(ShannonResults, SimpsonResults)
+                with INSTRUMENTS.stage('compute') as stage:               #times the calculation when instrumentation is on
+                    if int(indexChoice) == 1:
+                        ShannonResults = Shannon_Index(data)            #call Shannon_Index function using data as parameter if user selects option 1
+                        #print(ShannonResults)
+                    elif int(indexChoice) == 2:
+                        SimpsonResults = Simpson_Index(data)            #call Simpson_Index function using data as parameter if user selects option 2
+                        #print(SimpsonResults)
+                    elif int(indexChoice) == 3:
+                        ShannonResults = Shannon_Index(data)            #call both Shannon_Index and Simpson_Index functions using data as parameter if user selects option 3
+                        SimpsonResults = Simpson_Index(data)
+                        #print(ShannonResults, SimpsonResults)
+                    elif int(indexChoice) == 4:
+                        ProfileResults = Diversity_Profile(data)        #calculate every measure in one pass over the data if user selects option 4
+                    stage.add(records=1)
                 bioChoice = 'valid'                                 #set the loop variable to 'valid' to break out of the while loop
         except ValueError:
-            print('You have not entered a number (1, 2 or 3). Please try again.')   #catch any ValueErrors that result from the user not entering a number
+            print('You have not entered a number (1, 2, 3 or 4). Please try again.')   #catch any ValueErrors that result from the user not entering a number
 
     print('Your biodiversity index results have been calculated!')
     
     #file output section
-    import csv
     #create a variable to control the input while loop
     outName = 'invalid'
     #prompt the user to enter a file name for the calculated results until they enter a non-empty name
@@ -323,32 +2365,25 @@ def main():
         outputFileName = input('Please provide a file name for how you would like your file to be saved without the extension (i.e. BioIndexResults):')
         try:
             if len(outputFileName) >0:                                                      #checks if user entered a file name
-                fileOut = open(outputFileName+'.csv', 'w', newline='')                      #open/create a csv file using that name for writing
-                writer = csv.writer(fileOut)                                                #create a csv writer
-                writer.writerow(['Results for Biodiversity Index Calculator'])
-                if dataInputChoice.capitalize() == 'M':                                     #if the user had manually inputed data, write their data to the file with appropriate headings        
-                    writer.writerow(['Species Label', 'Number of Individuals'])
-                    counter = 1
-                    for item in data:                                                       #since the user only supplies numbers and no species labels, create species labels using the counter variable
-                        writer.writerow(['Species '+str(counter), item])
-                        counter +=1
-                if dataInputChoice.capitalize() == 'F':                                     #if the user had chosen a file of data, writer the original data to the file along with the chosen site identification
-                    writer.writerow(['Data provided for site:', site.capitalize()])
-                    writer.writerow(['Species Name', 'Number of Individuals'])
-                    for i in range(len(species)):
-                        writer.writerow([species[i], data[i]])
-                
-                #write the corresponding biodiversity index results to the file after the data depending on which index option the user chose
-                if indexChoice == '1':
-                    writer.writerow(['Shannon Diversity Index is:  ',round(ShannonResults[0], 3)])
-                    writer.writerow(['Shannon Equitability is:  ',round(ShannonResults[1],3)])
-                elif indexChoice == '2':
-                    writer.writerow(['Simpson Diversity Index is:  ',round(SimpsonResults, 3)])
-                elif indexChoice == '3':
-                    writer.writerow(['Shannon Diversity Index is:  ',round(ShannonResults[0],3)])
-                    writer.writerow(['Shannon Equitability is:  ',round(ShannonResults[1],3)])
-                    writer.writerow(['Simpson Diversity Index is:  ',round(SimpsonResults,3)])
-                
+                results = {}
+                #collect the biodiversity index results depending on which index option the user chose
+                if indexChoice in ('1', '3'):
+                    results['shannon'], results['equitability'] = ShannonResults
+                if indexChoice in ('2', '3'):
+                    #Simpson_Index returns an "N/A" message for fewer than 2 species; the value column holds numbers only, so it is written as NaN
+                    results['simpson'] = float('nan') if isinstance(SimpsonResults, str) else SimpsonResults
+                if indexChoice == '4':
+                    results = ProfileResults
+                #the writer appends to <name>_counts.csv and <name>_indices.csv, so results of earlier runs are kept
+                with CsvResultsWriter(outputFileName+'.csv') as writer:
+                    if dataInputChoice.capitalize() == 'M':                                 #since the user only supplies numbers and no species labels, create species labels using a counter
+                        siteLabel = 'Manual'
+                        writer.write_counts(siteLabel, ['Species '+str(counter) for counter in range(1, len(data)+1)], data)
+                    else:                                                                   #if the user had chosen a file of data, write the original data along with the chosen site identification
+                        siteLabel = site.capitalize()
+                        writer.write_counts(siteLabel, species, data)
+                    writer.write_indices(siteLabel, results)
+                print('Your results were saved to', writer.countsPath, 'and', writer.indicesPath)
                 outName='valid'                                                             #change the loop variable to valid to break out of the input while loop
             else:
                 print('You forgot to enter a file name for your results. Please try again!')
@@ -357,4 +2392,5 @@ def main():
             print()
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    import sys
+    sys.exit(Command_Line())
\ No newline at end of file
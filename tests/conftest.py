@@ -0,0 +1,26 @@
+import os
+import sys
+import time
+
+import pytest
+
+#the calculator is a single module at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def site_files(tmp_path):
+    #returns write(sites): writes one species file of 'Name, count' lines per site, {site: [(name, count), ...]},
+    #and returns the registry {site: path}. Writing a site again replaces its file. The files are dated a minute
+    #back, outside the result cache's window for files modified just before a run
+    def Write(sites):
+        registry = {}
+        for site, lines in sites.items():
+            path = str(tmp_path / (site + '.txt'))
+            with open(path, 'w') as f:
+                f.write(''.join(name + ', ' + str(count) + '\n' for name, count in lines))
+            old = time.time() - 60
+            os.utime(path, (old, old))
+            registry[site] = path
+        return registry
+    return Write
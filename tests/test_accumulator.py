@@ -0,0 +1,80 @@
+import decimal
+import math
+
+import pytest
+
+import calculator
+
+
+def Reference_Shannon(counts):
+    #Shannon's index worked out with 50 significant digits
+    with decimal.localcontext() as context:
+        context.prec = 50
+        total = sum(decimal.Decimal(n) for n in counts)
+        return float(-sum((decimal.Decimal(n) / total) * (decimal.Decimal(n) / total).ln() for n in counts))
+
+
+def test_results_match_the_scalar_functions():
+    data = {'Oak': 50, 'Ash': 30, 'Elm': 10, 'Yew': 5, 'Fir': 1}
+    accumulator = calculator.DiversityAccumulator()
+    for species, count in data.items():
+        for i in range(count):
+            accumulator.add(species)
+    H, E = calculator.Shannon_Index(list(data.values()))
+    assert accumulator.shannon() == pytest.approx((H, E))
+    assert accumulator.simpson() == pytest.approx(calculator.Simpson_Index(list(data.values())))
+    assert accumulator.richness() == 5
+    assert accumulator.total == 96
+
+
+def test_single_species_and_empty_accumulator():
+    accumulator = calculator.DiversityAccumulator({'Oak': 4})
+    H, E = accumulator.shannon()
+    assert H == 0.0 and math.isnan(E)
+    assert accumulator.simpson() == calculator.Simpson_Index([4])          #the same "N/A" message
+    with pytest.raises(ValueError):
+        calculator.DiversityAccumulator().shannon()
+
+
+def test_add_and_remove_round_trip():
+    accumulator = calculator.DiversityAccumulator({'Oak': 7, 'Ash': 3})
+    before = (accumulator.shannon(), accumulator.simpson(), dict(accumulator.counts))
+    accumulator.add('Elm', 12)
+    accumulator.add('Oak', 5)
+    accumulator.remove('Oak', 5)
+    accumulator.remove('Elm', 12)
+    assert 'Elm' not in accumulator.counts                                 #a species at zero is dropped
+    assert accumulator.shannon() == pytest.approx(before[0])
+    assert accumulator.simpson() == pytest.approx(before[1])
+    assert accumulator.counts == before[2]
+    assert accumulator.nnSum == 7 * 6 + 3 * 2
+    with pytest.raises(ValueError):
+        accumulator.remove('Ash', 4)
+    assert accumulator.counts['Ash'] == 3                                  #a refused removal changes nothing
+
+
+def test_merge_equals_one_accumulator_of_everything():
+    north = calculator.DiversityAccumulator({'Oak': 7, 'Ash': 3})
+    south = calculator.DiversityAccumulator([('Ash', 2), ('Elm', 9)])
+    everything = calculator.DiversityAccumulator({'Oak': 7, 'Ash': 5, 'Elm': 9})
+    assert north.merge(south) is north
+    assert north.counts == everything.counts
+    assert north.shannon() == pytest.approx(everything.shannon())
+    assert north.simpson() == everything.simpson()
+    assert south.counts == {'Ash': 2, 'Elm': 9}                            #the merged accumulator is not changed
+
+
+def test_stays_accurate_for_counts_in_the_billions():
+    counts = {'Oak': 7000000000, 'Ash': 3000000001, 'Elm': 5}
+    accumulator = calculator.DiversityAccumulator(counts)
+    for i in range(2000):
+        accumulator.add('Oak', 1)
+        accumulator.add('Elm', 1)
+        accumulator.remove('Ash', 1)
+    expected = {'Oak': 7000002000, 'Ash': 2999998001, 'Elm': 2005}
+    assert accumulator.counts == expected
+    H, E = accumulator.shannon()
+    assert H == pytest.approx(Reference_Shannon(expected.values()), rel=1e-14)
+    total = sum(expected.values())
+    assert accumulator.total == total
+    assert accumulator.nnSum == sum(n * (n - 1) for n in expected.values())   #exact integers
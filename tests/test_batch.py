@@ -0,0 +1,61 @@
+import math
+
+import pytest
+
+import calculator
+
+np = pytest.importorskip('numpy')
+
+
+def Scalar(data):
+    #the scalar index functions of one site of at least two species; zero counts are left out as absent species
+    data = [n for n in data if n > 0]
+    H, E = calculator.Shannon_Index(data)
+    return H, E, calculator.Simpson_Index(data)
+
+
+def Assert_Sites(batch, sites):
+    for i, data in enumerate(sites):
+        for value, expected in zip((batch[0][i], batch[1][i], batch[2][i]), Scalar(data)):
+            assert value == pytest.approx(expected)
+
+
+def test_dense_rows_match_the_scalar_functions():
+    sites = [[50, 30, 10, 5], [1, 1, 1, 1], [7, 2, 9, 4], [100, 1, 1, 1]]
+    Assert_Sites(calculator.Batch_Index(sites), sites)
+
+
+def test_zeros_are_absent_species():
+    batch = calculator.Batch_Index([[5, 0, 3, 0], [0, 2, 2, 0]])
+    Assert_Sites(batch, [[5, 3], [2, 2]])
+    assert batch[1][0] == pytest.approx(calculator.Shannon_Index([5, 3])[1])     #log of 2 species, not 4
+
+
+def test_ragged_offsets_match_the_dense_rows():
+    sites = [[50, 30, 10, 5], [4, 4], [7, 2, 9, 4, 1, 1, 3]]
+    flat = [n for data in sites for n in data]
+    offsets = np.cumsum([0] + [len(data) for data in sites])
+    Assert_Sites(calculator.Batch_Index(flat, offsets), sites)
+
+
+def test_simpson_uses_the_n_minus_one_correction():
+    shannon, equitability, simpson = calculator.Batch_Index([[2, 2], [1, 1]])
+    assert simpson[0] == pytest.approx(1 - (2 + 2) / (4 * 3))                     #2/3, not the uncorrected 1/2
+    assert simpson[1] == pytest.approx(calculator.Simpson_Index([1, 1])) == 1.0
+
+
+def test_sites_that_cannot_be_scored_are_nan():
+    #one species, no individuals at all, and an empty ragged site
+    shannon, equitability, simpson = calculator.Batch_Index([5, 0, 0, 1, 2], [0, 1, 3, 3, 5])
+    assert shannon[0] == 0.0 and math.isnan(equitability[0]) and math.isnan(simpson[0])
+    assert all(math.isnan(values[i]) for values in (shannon, equitability, simpson) for i in (1, 2))
+    assert simpson[3] == pytest.approx(calculator.Simpson_Index([1, 2]))
+
+
+def test_bad_offsets_are_rejected():
+    with pytest.raises(ValueError):
+        calculator.Batch_Index([1, 2, 3], [0, 2])
+    with pytest.raises(ValueError):
+        calculator.Batch_Index([1, 2, 3], [0, 2, 1, 3])
+    with pytest.raises(ValueError):
+        calculator.Batch_Index([1, 2, 3])
@@ -0,0 +1,35 @@
+import pytest
+
+import calculator
+
+np = pytest.importorskip('numpy')
+
+
+def Store(tmp_path, site_files, matrix):
+    #a count store of the rows of 'matrix'; a store orders its species by first appearance, which no measure depends on
+    sites = {'site' + str(row): [('sp' + str(j), int(count)) for j, count in enumerate(counts) if count] for row, counts in enumerate(matrix)}
+    store, failures = calculator.Convert_Species_Files(site_files(sites), str(tmp_path / 'store'))
+    assert failures == {}
+    return store
+
+
+def test_workers_share_the_matrix_instead_of_copying_it(tmp_path, site_files):
+    matrix = np.random.default_rng(1).integers(0, 20, size=(12, 6)).astype(np.float64)
+    store = Store(tmp_path, site_files, matrix)
+    source, shared = calculator._Beta_Share(store.counts)
+    assert source[0] == 'file' and shared is None                    #a whole store is mapped by the workers
+    source, shared = calculator._Beta_Share(store.counts[2:])
+    assert source[0] == 'shared'                                     #part of one is copied once into shared memory
+    shared.close()
+    shared.unlink()
+
+
+@pytest.mark.parametrize('metric', calculator.BETA_METRICS)
+def test_worker_processes_match_a_single_process(tmp_path, site_files, metric):
+    matrix = np.random.default_rng(2).integers(0, 20, size=(12, 6)).astype(np.float64)
+    store = Store(tmp_path, site_files, matrix)
+    expected = calculator.Pairwise_Dissimilarity(matrix, metric, tile=5, workers=0)
+    np.testing.assert_allclose(calculator.Pairwise_Dissimilarity(matrix, metric, tile=5, workers=2), expected)
+    np.testing.assert_allclose(calculator.Pairwise_Dissimilarity(store.counts, metric, tile=5, workers=2), expected)
+    neighbours, values = calculator.Nearest_Sites(store.counts, 3, metric, tile=5, workers=2)
+    np.testing.assert_allclose(values, np.sort(np.where(np.eye(12, dtype=bool), np.inf, expected), axis=1)[:, :3])
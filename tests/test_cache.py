@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import calculator
+
+
+def Score(registry, cachePath, maxEntries=100000, withCounts=False):
+    with calculator.ResultCache(cachePath, maxEntries) as cache:
+        results, failures, siteData = calculator.Score_Sites(registry, ('shannon',), cache, withCounts=withCounts)
+        return results, siteData, cache.hits, cache.misses
+
+
+def test_unchanged_file_is_answered_from_the_cache(tmp_path, site_files):
+    registry = site_files({'A': [('Oak', 3), ('Ash', 5)]})
+    cachePath = str(tmp_path / 'cache.db')
+    first, siteData, hits, misses = Score(registry, cachePath)
+    assert (hits, misses) == (0, 1)
+    assert 'A' in siteData
+    second, siteData, hits, misses = Score(registry, cachePath)
+    assert (hits, misses) == (1, 0)
+    assert 'A' not in siteData
+    assert second == first
+
+
+def test_edited_file_is_recomputed(tmp_path, site_files):
+    path = site_files({'A': [('Oak', 3), ('Ash', 5)]})['A']
+    cachePath = str(tmp_path / 'cache.db')
+    first = Score({'A': path}, cachePath)[0]
+    info = os.stat(path)
+    site_files({'A': [('Oak', 5), ('Ash', 3)]})                  #same size, so only the modification time tells
+    os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns + 10**9))
+    second, siteData, hits, misses = Score({'A': path}, cachePath)
+    assert (hits, misses) == (0, 1)
+    assert second['A'][2]['shannon'] == first['A'][2]['shannon']  #same abundances, different species
+    site_files({'A': [('Oak', 3), ('Ash', 5), ('Elm', 1)]})
+    third, siteData, hits, misses = Score({'A': path}, cachePath)
+    assert (hits, misses) == (0, 1)
+    assert third['A'][0] == 3
+
+
+def test_recently_modified_file_is_not_trusted_by_its_time_stamp(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_text('Oak, 3\nAsh, 5\n')
+    cachePath = str(tmp_path / 'cache.db')
+    Score({'A': str(path)}, cachePath)
+    results, siteData, hits, misses = Score({'A': str(path)}, cachePath)
+    assert 'A' in siteData                                         #read again, but only once, to be sure
+    assert (hits, misses) == (0, 1)
+
+
+def test_file_changed_while_it_is_read_is_cached_under_the_bytes_parsed(tmp_path, site_files, monkeypatch):
+    path = site_files({'A': [('Oak', 3), ('Ash', 5)]})['A']
+    original = open(path, 'rb').read()
+    reader = calculator.Read_Species_File
+
+    def Editing_Reader(filename, *args, **kwargs):
+        with open(filename, 'w') as f:                             #edited after its stat(), before it is parsed
+            f.write('Oak, 3\nAsh, 9\n')
+        yield from reader(filename, *args, **kwargs)
+        with open(filename, 'wb') as f:                            #and then put back as it was
+            f.write(original)
+    monkeypatch.setattr(calculator, 'Read_Species_File', Editing_Reader)
+    cachePath = str(tmp_path / 'cache.db')
+    first = Score({'A': path}, cachePath)[0]
+    assert first['A'][2]['shannon'] == pytest.approx(calculator.compute([3, 9], 'shannon')['shannon'])
+    monkeypatch.undo()
+    second = Score({'A': path}, cachePath)[0]
+    assert second['A'][2]['shannon'] == pytest.approx(calculator.compute([3, 5], 'shannon')['shannon'])
+
+
+def test_least_recently_used_results_are_evicted(tmp_path, site_files):
+    registry = site_files({site: [('Oak', i + 1), ('Ash', 2)] for i, site in enumerate('ABC')})
+    cachePath = str(tmp_path / 'cache.db')
+    Score({'A': registry['A'], 'B': registry['B']}, cachePath, maxEntries=2)
+    Score({'A': registry['A']}, cachePath, maxEntries=2)           #B is now the least recently used
+    Score({'C': registry['C']}, cachePath, maxEntries=2)
+    results, siteData, hits, misses = Score(registry, cachePath, maxEntries=2)
+    assert sorted(siteData) == ['B']
+    assert (hits, misses) == (2, 1)
+
+
+def test_cached_sites_keep_their_counts(tmp_path, site_files):
+    registry = site_files({'A': [('Oak', 3), ('Ash', 5)]})
+    cachePath = str(tmp_path / 'cache.db')
+    Score(registry, cachePath)                                     #cached without counts
+    results, siteData, hits, misses = Score(registry, cachePath, withCounts=True)
+    assert (hits, misses) == (0, 1)                                #read again for its counts
+    assert siteData['A'][:2] == (['Oak', 'Ash'], [3, 5])
+    results, siteData, hits, misses = Score(registry, cachePath, withCounts=True)
+    assert (hits, misses) == (1, 0)
+    assert siteData['A'][:2] == (['Oak', 'Ash'], [3, 5])
+
+
+def test_command_line_writes_counts_of_cached_sites(tmp_path, site_files):
+    path = site_files({'A': [('Oak', 3), ('Ash', 5)]})['A']
+    cachePath = str(tmp_path / 'cache.db')
+    for run in ('first', 'second'):
+        out = str(tmp_path / (run + '.csv'))
+        assert calculator.Command_Line(['--input', path, '--cache', cachePath, '--out', out]) == 0
+        tables = calculator.Read_Results(out)
+        assert list(tables['counts']['species']) == ['Oak', 'Ash']
+        assert [float(count) for count in tables['counts']['count']] == [3, 5]
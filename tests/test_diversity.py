@@ -0,0 +1,30 @@
+import math
+
+import pytest
+
+import calculator
+
+
+def test_profile_matches_the_index_functions():
+    data = [50, 30, 10, 5, 3, 1, 1, 2]
+    profile = calculator.Diversity_Profile(data)
+    H, E = calculator.Shannon_Index(data)
+    assert profile['shannon'] == pytest.approx(H)
+    assert profile['equitability'] == pytest.approx(E)
+    assert profile['simpson'] == pytest.approx(calculator.Simpson_Index(data))
+
+
+@pytest.mark.parametrize('q', [0.5, 3, -1, -2.5])
+def test_hill_numbers_match_the_definition(q):
+    data = [50, 30, 10, 5, 3, 1, 1, 2]
+    total = sum(data)
+    expected = sum((n / total) ** q for n in data) ** (1 / (1 - q))
+    assert calculator.Diversity_Profile(data, q=[q])['hill_' + format(q, 'g')] == pytest.approx(expected)
+
+
+def test_high_order_hill_numbers_do_not_overflow():
+    results = calculator.compute([3000, 5000], 'hill_150,hill_-150,hill_inf,hill_-inf')
+    assert math.isfinite(results['hill_150']) and math.isfinite(results['hill_-150'])
+    assert results['hill_inf'] == pytest.approx(8000 / 5000)      #1 / Berger-Parker
+    assert results['hill_-inf'] == pytest.approx(8000 / 3000)     #N / smallest count
+    assert results['hill_inf'] <= results['hill_150'] <= results['hill_-150'] <= results['hill_-inf']
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import calculator
+
+
+def Recorded(scenario):
+    #runs scenario() with the global instrumentation on and returns its stages
+    calculator.INSTRUMENTS.reset()
+    calculator.INSTRUMENTS.enable()
+    try:
+        scenario()
+        return calculator.INSTRUMENTS.report()['stages']
+    finally:
+        calculator.INSTRUMENTS.disable()
+        calculator.INSTRUMENTS.reset()
+
+
+def test_cache_stage_counts_database_bytes_and_input_counts_hashed_files(tmp_path, site_files):
+    path = site_files({'A': [('Oak', 3), ('Ash', 5)]})['A']
+    cachePath = str(tmp_path / 'cache.db')
+
+    def Score():
+        with calculator.ResultCache(cachePath) as cache:
+            calculator.Score_Sites({'A': path}, cache=cache, withCounts=True)
+
+    first = Recorded(Score)
+    assert first['input']['bytes_read'] == os.path.getsize(path)      #read, parsed and hashed once
+    assert first['cache']['bytes_written'] > 0
+    second = Recorded(Score)
+    assert second['input']['bytes_read'] == 0
+    assert second['cache']['bytes_read'] > 0
+    assert second['cache']['records'] == 1
+
+
+def test_reset_stops_a_running_profile():
+    calculator.INSTRUMENTS.enable(profile=True)
+    try:
+        assert sys.getprofile() is not None
+        calculator.INSTRUMENTS.reset()
+        assert sys.getprofile() is None
+    finally:
+        calculator.INSTRUMENTS.disable()
+        calculator.INSTRUMENTS.reset()
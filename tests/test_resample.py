@@ -0,0 +1,61 @@
+import math
+
+import pytest
+
+import calculator
+
+np = pytest.importorskip('numpy')
+
+SITES = {'North': [50, 30, 10, 5, 3, 1], 'South': [8, 8, 4, 2], 'East': (['Oak', 'Ash'], [12, 3], None)}
+
+
+def test_same_seed_gives_the_same_results():
+    first = calculator.Resample_Index(SITES['North'], resamples=200, seed=7)
+    assert calculator.Resample_Index(SITES['North'], resamples=200, seed=7) == first
+    assert calculator.Resample_Index(SITES['North'], resamples=200, seed=8) != first
+    #drawing the resamples in smaller batches draws the same numbers
+    assert calculator.Resample_Index(SITES['North'], resamples=200, seed=7, batchSize=33) == first
+
+
+def test_sites_get_the_same_results_in_one_or_two_processes():
+    single, failures = calculator.Resample_Sites(SITES, resamples=100, seed=3, workers=1)
+    assert failures == {}
+    pooled, failures = calculator.Resample_Sites(SITES, resamples=100, seed=3, workers=2)
+    assert failures == {}
+    assert pooled == single
+    assert single['North'] != single['South']                      #every site has its own child seed
+
+
+@pytest.mark.parametrize('depth', [None, 0, 107])
+def test_rarefaction_depth_is_checked(depth):
+    with pytest.raises(ValueError):
+        calculator.Resample_Index(SITES['North'], method='rarefy', depth=depth)   #99 individuals
+
+
+def test_rarefying_to_the_whole_site_gives_the_site_itself():
+    summary = calculator.Resample_Index(SITES['North'], method='rarefy', depth=99, resamples=20, seed=1)
+    H, E = calculator.Shannon_Index(SITES['North'])
+    assert summary['shannon']['mean'] == pytest.approx(H)
+    assert summary['shannon']['low'] == pytest.approx(H) == summary['shannon']['high']
+    assert summary['simpson']['stderr'] == pytest.approx(0.0, abs=1e-12)
+
+
+@pytest.mark.parametrize('method,depth', [('bootstrap', None), ('rarefy', 20)])
+def test_intervals_are_ordered(method, depth):
+    summary = calculator.Resample_Index(SITES['North'], method=method, depth=depth, resamples=500, seed=5)
+    for name in ('shannon', 'equitability', 'simpson'):
+        assert summary[name]['low'] <= summary[name]['mean'] <= summary[name]['high']
+        assert summary[name]['stderr'] > 0
+    narrow = calculator.Resample_Index(SITES['North'], method=method, depth=depth, resamples=500, seed=5, confidence=0.5)
+    assert summary['shannon']['low'] <= narrow['shannon']['low'] <= narrow['shannon']['high'] <= summary['shannon']['high']
+
+
+def test_bad_sites_and_options_are_failures():
+    results, failures = calculator.Resample_Sites({'Empty': [0, 0], 'North': SITES['North']}, resamples=10, workers=0)
+    assert list(results) == ['North'] and list(failures) == ['Empty']
+    with pytest.raises(ValueError):
+        calculator.Resample_Index(SITES['North'], method='jackknife')
+    with pytest.raises(ValueError):
+        calculator.Resample_Index(SITES['North'], confidence=1.5)
+    single = calculator.Resample_Index([40], resamples=10, seed=0)
+    assert math.isnan(single['simpson']['mean'])                   #never two species in a resample
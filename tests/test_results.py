@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import calculator
+
+
+def Write(path, site, counts, results):
+    with calculator.Open_Results_Writer(path, bufferRows=4) as writer:
+        writer.write_counts(site, ['sp' + str(i) for i in range(len(counts))], counts)
+        writer.write_indices(site, results)
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.npz'])
+def test_results_are_appended_and_read_back(tmp_path, extension):
+    if extension == '.npz':
+        pytest.importorskip('numpy')
+    path = str(tmp_path / ('results' + extension))
+    Write(path, 'A', [1, 2, 3, 4, 5], {'shannon': 1.5})
+    Write(path, 'B', [7, 8], {'shannon': 0.5, 'simpson': 0.25})
+    tables = calculator.Read_Results(path)
+    assert list(tables['counts']['site']) == ['A'] * 5 + ['B'] * 2
+    assert list(tables['counts']['species']) == ['sp0', 'sp1', 'sp2', 'sp3', 'sp4', 'sp0', 'sp1']
+    assert list(tables['counts']['count']) == [1, 2, 3, 4, 5, 7, 8]
+    assert list(tables['indices']['index']) == ['shannon', 'shannon', 'simpson']
+    assert list(tables['indices']['value']) == [1.5, 0.5, 0.25]
+
+
+def test_npz_parts_are_read_in_numeric_order(tmp_path):
+    pytest.importorskip('numpy')
+    path = str(tmp_path / 'results.npz')
+    Write(path, 'first', [1], {})
+    os.rename(str(tmp_path / 'results_part00000.npz'), str(tmp_path / 'results_part99999.npz'))
+    Write(path, 'second', [2], {})
+    assert os.path.exists(str(tmp_path / 'results_part100000.npz'))
+    (tmp_path / 'results_part100001.npz.tmp').write_bytes(b'an unfinished part is ignored')
+    assert list(calculator.Read_Results(path)['counts']['site']) == ['first', 'second']
+
+
+def test_npz_writers_sharing_a_path_keep_each_others_parts(tmp_path):
+    pytest.importorskip('numpy')
+    path = str(tmp_path / 'results.npz')
+    with calculator.Open_Results_Writer(path) as first, calculator.Open_Results_Writer(path) as second:
+        first.write_counts('A', ['Oak'], [1])
+        second.write_counts('B', ['Ash'], [2])
+        first.flush()
+        second.flush()
+    assert sorted(calculator.Read_Results(path)['counts']['site']) == ['A', 'B']
+    assert sorted(os.listdir(str(tmp_path))) == ['results_part00000.npz', 'results_part00001.npz']
+
+
+def test_interactive_simpson_of_one_species_is_written_as_nan(tmp_path, monkeypatch):
+    answers = iter(['F', 'A', '2', str(tmp_path / 'single')])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    monkeypatch.setattr(calculator, 'File_Input', lambda site: (['Oak'], [5]))
+    calculator.main()
+    values = calculator.Read_Results(str(tmp_path / 'single.csv'))['indices']['value']
+    assert [float(value) for value in values] == [pytest.approx(float('nan'), nan_ok=True)]
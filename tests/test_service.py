@@ -0,0 +1,198 @@
+import asyncio
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import calculator
+
+pytest.importorskip('numpy')
+
+
+async def Request(port, method, path, body=None, headers=None):
+    #sends one HTTP/1.1 request on its own connection and returns (status, decoded JSON payload)
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        data = b'' if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode('utf-8'))
+        head = method + ' ' + path + ' HTTP/1.1\r\nHost: test\r\nConnection: close\r\n'
+        for name, value in (headers or {}).items():
+            head += name + ': ' + value + '\r\n'
+        head += 'Content-Length: ' + str(len(data)) + '\r\n\r\n'
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, separator, payload = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+
+def Run(scenario, **options):
+    #starts a ScoringService on a free port (with a thread pool by default), runs scenario(service, port) and stops the service
+    options.setdefault('pool', 'thread')
+
+    async def Main():
+        service = calculator.ScoringService(**options)
+        server = await service.start('127.0.0.1', 0)
+        try:
+            return await scenario(service, server.sockets[0].getsockname()[1])
+        finally:
+            await service.stop()
+    return asyncio.run(Main())
+
+
+def test_score_endpoints_match_the_index_functions():
+    counts = [3, 4, 5, 9]
+
+    async def Scenario(service, port):
+        return [await Request(port, 'POST', path, {'counts': counts}) for path in ('/shannon', '/simpson', '/score')]
+
+    (status1, shannon), (status2, simpson), (status3, score) = Run(Scenario)
+    assert status1 == status2 == status3 == 200
+    H, E = calculator.Shannon_Index(counts)
+    assert shannon == pytest.approx({'shannon': H, 'equitability': E})
+    assert simpson == pytest.approx({'simpson': calculator.Simpson_Index(counts)})
+    assert score == pytest.approx({'shannon': H, 'equitability': E, 'simpson': calculator.Simpson_Index(counts)})
+
+
+def test_batch_endpoint_scores_every_site():
+    sites = [[1, 2], [5, 5, 5], [7]]
+
+    async def Scenario(service, port):
+        return await Request(port, 'POST', '/batch', {'sites': sites})
+
+    status, payload = Run(Scenario)
+    assert status == 200
+    assert len(payload['results']) == 3
+    assert payload['results'][1]['simpson'] == pytest.approx(calculator.Simpson_Index([5, 5, 5]))
+    assert payload['results'][2]['simpson'] is None          #a single species has no Simpson's index
+
+
+def test_health_and_metrics():
+    async def Scenario(service, port):
+        await Request(port, 'POST', '/score', {'counts': [1, 2, 3]})
+        return await Request(port, 'GET', '/health'), await Request(port, 'GET', '/metrics')
+
+    (healthStatus, health), (metricsStatus, metrics) = Run(Scenario)
+    assert healthStatus == 200 and health == {'status': 'ok'}
+    assert metricsStatus == 200
+    assert metrics['requests'] == 2
+    assert metrics['errors'] == 0
+    assert metrics['latency_p50_ms'] is not None
+
+
+@pytest.mark.parametrize('body', [
+    b'not json',
+    {'counts': []},
+    {'counts': 'x'},
+    {'counts': [1, True]},
+    {'counts': [-1, 2]},
+    {'counts': [1, 10 ** 400]},
+    b'{"counts": [1, NaN]}',
+    b'{"counts": [1, Infinity]}',
+    {'sites': [[1, 2], [3, -4]]},
+])
+def test_invalid_counts_are_rejected_with_400(body):
+    path = '/batch' if isinstance(body, dict) and 'sites' in body else '/score'
+
+    async def Scenario(service, port):
+        return await Request(port, 'POST', path, body)
+
+    status, payload = Run(Scenario)
+    assert status == 400
+    assert 'error' in payload
+
+
+def test_unknown_path_wrong_method_and_oversized_requests():
+    async def Scenario(service, port):
+        return (await Request(port, 'GET', '/nope'),
+                await Request(port, 'GET', '/score'),
+                await Request(port, 'POST', '/score', {'counts': list(range(1, 200))}),
+                await Request(port, 'GET', '/health', headers={'X-Long': 'x' * 70000}))
+
+    notFound, wrongMethod, tooLarge, headerTooLong = Run(Scenario, maxBody=100)
+    assert notFound[0] == 404
+    assert wrongMethod[0] == 405
+    assert tooLarge[0] == 413
+    assert headerTooLong[0] == 431
+
+
+def test_bad_request_does_not_fail_its_batch():
+    #requests sent together are micro-batched; the invalid one must not change the answers of the others
+    async def Scenario(service, port):
+        return await asyncio.gather(Request(port, 'POST', '/score', {'counts': [1, 2, 3]}),
+                                    Request(port, 'POST', '/score', {'counts': [1, int('9' * 400)]}),
+                                    Request(port, 'POST', '/score', {'counts': [4, 4]}))
+
+    good, bad, other = Run(Scenario, maxDelay=0.05)
+    assert good[0] == 200 and good[1]['shannon'] == pytest.approx(calculator.Shannon_Index([1, 2, 3])[0])
+    assert bad[0] == 400
+    assert other[0] == 200 and other[1]['shannon'] == pytest.approx(math.log(2))
+
+
+def test_vector_that_fails_scoring_only_fails_its_own_request(monkeypatch):
+    #a vector that passes validation but breaks the batch computation is scored again on its own
+    scoreVectors = calculator.Score_Vectors
+
+    def Failing(vectors):
+        if any(13 in vector for vector in vectors):
+            raise RuntimeError('cannot score 13')
+        return scoreVectors(vectors)
+
+    monkeypatch.setattr(calculator, 'Score_Vectors', Failing)
+
+    async def Scenario(service, port):
+        return await asyncio.gather(Request(port, 'POST', '/score', {'counts': [1, 2, 3]}),
+                                    Request(port, 'POST', '/score', {'counts': [13, 2]}),
+                                    Request(port, 'POST', '/score', {'counts': [4, 4]}))
+
+    good, bad, other = Run(Scenario, maxDelay=0.05)
+    assert good[0] == 200
+    assert bad[0] == 500
+    assert other[0] == 200
+
+
+def test_large_bodies_are_parsed_off_the_event_loop(monkeypatch):
+    parseCounts = calculator._Parse_Counts
+    threads = []
+
+    def Recording(body, key):
+        threads.append(threading.current_thread() is threading.main_thread())
+        return parseCounts(body, key)
+
+    monkeypatch.setattr(calculator, '_Parse_Counts', Recording)
+
+    async def Scenario(service, port):
+        return [(await Request(port, 'POST', path, body))[0] for path, body in (
+            ('/score', {'counts': [1, 2]}),
+            ('/score', {'counts': list(range(1, 100))}),
+            ('/batch', {'sites': [[1, 2]]}),
+            ('/batch', {'sites': [[1, -2]]}))]
+
+    assert Run(Scenario, maxInlineBody=100) == [200, 200, 200, 400]
+    assert threads == [True, False, False, False]                 #only the small single vector is parsed on the loop
+
+
+def test_stop_leaves_a_pool_it_was_given_running():
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    async def Scenario(service, port):
+        return await Request(port, 'POST', '/score', {'counts': [1, 2, 3]})
+
+    try:
+        assert Run(Scenario, pool=pool)[0] == 200
+        assert pool.submit(sum, [1, 2]).result() == 3
+    finally:
+        pool.shutdown()
+
+
+def test_load_test_reports_latency():
+    async def Scenario(service, port):
+        return await calculator.Load_Test('127.0.0.1', port, requests=200, concurrency=8, species=10)
+
+    report = Run(Scenario)
+    assert report['requests'] == 200
+    assert report['errors'] == 0
+    assert report['latency_p50_ms'] <= report['latency_p99_ms']
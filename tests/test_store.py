@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+import calculator
+
+np = pytest.importorskip('numpy')
+
+
+def test_store_scores_match_compute(tmp_path, site_files):
+    rng = np.random.default_rng(3)
+    sites = {'site' + str(i): [('sp' + str(j), int(rng.integers(1, 50))) for j in rng.choice(30, size=int(rng.integers(1, 30)), replace=False)]
+             for i in range(25)}
+    store, failures = calculator.Convert_Species_Files(site_files(sites), str(tmp_path / 'store'))
+    indices = 'all,hill_0.5,hill_3,hill_inf,hill_-inf,hill_150'
+    order = ['site7', 'site3', 'missing', 'site3', 'site20']
+    for wanted in (None, order):
+        results, failures = store.score_sites(indices, wanted, maxCells=70)   #blocks of 2 rows
+        assert failures == ({} if wanted is None else {'missing': "site 'missing' is not in the store " + store.directory})
+        for site, (speciesCount, individuals, values) in results.items():
+            data = [count for name, count in sites[site]]
+            assert (speciesCount, individuals) == (len(data), sum(data))
+            expected = calculator.compute(data, indices)
+            assert list(values) == list(expected)
+            assert type(values['richness']) is int
+            for column in expected:
+                assert values[column] == pytest.approx(expected[column], nan_ok=True)
+    assert store.score('site3', 'hill_2') == pytest.approx(calculator.compute([count for name, count in sites['site3']], 'hill_2'))
+    with pytest.raises(KeyError):
+        store.score('missing')
+
+
+def test_batch_profile_of_an_empty_site_is_nan():
+    profile = calculator.Batch_Profile([[0, 0, 0], [1, 2, 0]], q=(0, 0.5, math.inf))
+    assert list(profile['richness']) == [0, 2]
+    assert all(math.isnan(values[0]) for name, values in profile.items() if name not in ('individuals', 'richness'))
+
+
+def test_file_changed_between_passes_is_a_failure(tmp_path, site_files, monkeypatch):
+    registry = site_files({'A': [('Oak', 3)], 'B': [('Ash', 2), ('Elm', 1)], 'C': [('Oak', 1), ('Elm', 4)]})
+    reader = calculator.Read_Species_File
+    passes = {}
+
+    def Changing_Reader(path, *args, **kwargs):
+        passes[path] = passes.get(path, 0) + 1
+        if path == registry['B'] and passes[path] == 2:
+            with open(path, 'a') as f:
+                f.write('Yew, 7\n')
+        return reader(path, *args, **kwargs)
+    monkeypatch.setattr(calculator, 'Read_Species_File', Changing_Reader)
+    store, failures = calculator.Convert_Species_Files(registry, str(tmp_path / 'store'))
+    assert list(failures) == ['B']
+    assert 'changed while it was being converted' in failures['B']
+    assert store.sites == ['A', 'C']
+    assert store.counts.shape == (2, len(store.species))
+    assert store.site_counts('C') == (['Oak', 'Elm'], [1.0, 4.0])